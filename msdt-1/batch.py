@@ -0,0 +1,162 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from main import BoardError, Solver, read_boards, solution_record
+'''
+Solves many boards and writes one JSON line per board, e.g.
+    python batch.py boards/ --workers 8 --time-limit 10 > results.jsonl
+
+The input is a directory of board .txt files, which are solved in name
+order, a .txt file of boards separated by blank lines, with the file
+name and line of the board as id, or a JSONL file ('-' for stdin) with
+one board per line:
+    {"id": "b1", "board": "WWWW...\\nWWWW...\\n..."}
+The id is optional and defaults to the line number. A malformed board
+in a .txt file of boards stops the batch with its line and column, while
+a JSONL line that isn't JSON or has no board gives an error result with
+the line number as id.
+
+Every result line holds the id, the cost (null if there is no solution),
+the moves as [action, cost, row, col], the nodes expanded, the seconds
+elapsed, the limit that stopped the search if any ('time') with the
+proven lower bound of the cost, and the error for boards that could
+not be solved. Results are written in input order as soon as they are
+ready.
+'''
+
+# Solver of the current process, reused for every board it solves
+batch_solver = None
+
+
+# -------------------------------------------------------------------------------
+def read_puzzles(path):
+    """Yields (id, board text, parse_board result) of every board in a
+    directory, .txt file of boards or JSONL file.
+
+    Only the boards of a .txt file of boards are parsed while reading,
+    see read_boards; the result is None for the others. A JSONL line
+    that can't be read gives (line number, None, error message).
+    """
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith('.txt'):
+                with open(os.path.join(path, name)) as f:
+                    yield name, f.read(), None
+        return
+    if path.endswith('.txt'):
+        with open(path) as f:
+            text = f.read()
+        name = os.path.basename(path)
+        for line, board, parsed in read_boards(text):
+            yield '{}:{}'.format(name, line), board, parsed
+        return
+
+    with (open(path) if path != '-' else contextlib.nullcontext(sys.stdin)) \
+            as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                puzzle = json.loads(line)
+                board = puzzle['board']
+            except json.JSONDecodeError as e:
+                yield number, None, 'Line {}: not JSON, {}'.format(number, e)
+                continue
+            except (KeyError, TypeError):
+                yield number, None, 'Line {}: no board'.format(number)
+                continue
+            yield puzzle.get('id', number), board, None
+
+
+# -------------------------------------------------------------------------------
+def solve_puzzle(puzzle, search='dfs', time_limit=None):
+    """Solves one (id, board text, parse_board result or None) puzzle
+    and returns its result dict."""
+    global batch_solver
+
+    if batch_solver is None:
+        batch_solver = Solver(quiet=True)
+    puzzle_id, text, parsed = puzzle
+    result = {'id': puzzle_id}
+    # A line read_puzzles couldn't read, parsed holds its error
+    if text is None:
+        result['error'] = parsed
+        return result
+    try:
+        solution = batch_solver.solve_board(text, search,
+                                            time_limit=time_limit,
+                                            parsed=parsed)
+    except ValueError as e:
+        result['error'] = str(e)
+        return result
+
+    result.update(solution_record(solution))
+    return result
+
+
+# -------------------------------------------------------------------------------
+def solve_batch(puzzles, workers=1, search='dfs', time_limit=None):
+    """Solves the puzzles of read_puzzles and yields their results in
+    order.
+
+    With workers > 1 the boards are solved by a process pool. Only a few
+    boards per worker are handed out ahead of the results, so the input
+    is read lazily and the first results come out while later boards
+    are still being read.
+    """
+    if workers <= 1:
+        for puzzle in puzzles:
+            yield solve_puzzle(puzzle, search, time_limit)
+        return
+
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for puzzle in puzzles:
+            pending.append(pool.submit(solve_puzzle, puzzle, search,
+                                       time_limit))
+            if len(pending) >= 4 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# -------------------------------------------------------------------------------
+# Main
+# -------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='Solves many knight and '
+                                                 'monsters boards and writes '
+                                                 'the results as JSON lines.')
+    parser.add_argument('input',
+                        help='directory of board .txt files, .txt file of '
+                             'boards or JSONL file, - for stdin')
+    parser.add_argument('--output', default='-',
+                        help='JSONL file to write, stdout by default')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes, one per core by default')
+    parser.add_argument('--search', choices=('dfs', 'astar'), default='dfs',
+                        help='depth-first branch and bound (default) '
+                             'or best-first A* search')
+    parser.add_argument('--time-limit', type=float,
+                        help='seconds per board, no limit by default')
+    args = parser.parse_args()
+
+    puzzles = read_puzzles(args.input)
+    with (open(args.output, 'w') if args.output != '-'
+          else contextlib.nullcontext(sys.stdout)) as out:
+        try:
+            for result in solve_batch(puzzles, args.workers, args.search,
+                                      args.time_limit):
+                out.write(json.dumps(result) + '\n')
+                out.flush()
+        except BoardError as e:
+            sys.exit('{}: {}'.format(args.input, e))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+import batch
+from main_test import SAMPLE_BOARD, SMALL_BOARDS
+
+
+BOARDS = [('sample', SAMPLE_BOARD, 220)] + \
+    [(param.id, *param.values) for param in SMALL_BOARDS]
+
+
+def test_read_puzzles_directory(tmp_path):
+    """Test the .txt boards of a directory are read in name order."""
+    for name, text, _ in BOARDS:
+        (tmp_path / (name + '.txt')).write_text(text)
+    (tmp_path / 'notes.md').write_text('not a board')
+    puzzles = list(batch.read_puzzles(str(tmp_path)))
+    assert puzzles == sorted((name + '.txt', text, None)
+                             for name, text, _ in BOARDS)
+
+
+def test_read_puzzles_jsonl(tmp_path):
+    """Test boards are read from JSONL with the line number as default id."""
+    path = tmp_path / 'boards.jsonl'
+    path.write_text(json.dumps({'id': 'a', 'board': SAMPLE_BOARD}) + '\n\n' +
+                    json.dumps({'board': SAMPLE_BOARD}) + '\n')
+    assert list(batch.read_puzzles(str(path))) == [('a', SAMPLE_BOARD, None),
+                                                   (3, SAMPLE_BOARD, None)]
+
+
+def test_read_puzzles_jsonl_errors(tmp_path):
+    """Test JSONL lines that aren't JSON or have no board give error
+    results and the boards after them are still solved."""
+    path = tmp_path / 'boards.jsonl'
+    path.write_text('{"id": "a", "board": \n' +
+                    json.dumps({'id': 'b'}) + '\n[1, 2]\n' +
+                    json.dumps({'id': 'c', 'board': SAMPLE_BOARD}) + '\n')
+    results = list(batch.solve_batch(batch.read_puzzles(str(path))))
+    assert results[0]['id'] == 1
+    assert results[0]['error'].startswith('Line 1: not JSON')
+    assert results[1:3] == [{'id': 2, 'error': 'Line 2: no board'},
+                            {'id': 3, 'error': 'Line 3: no board'}]
+    assert results[3]['id'] == 'c' and results[3]['cost'] == 220
+
+
+def test_read_puzzles_boards_file(tmp_path):
+    """Test a .txt file of boards is read with the file and line as id,
+    and its boards are solved without parsing them again."""
+    path = tmp_path / 'boards.txt'
+    path.write_text(SAMPLE_BOARD + '\n' + SAMPLE_BOARD)
+    puzzles = list(batch.read_puzzles(str(path)))
+    assert [puzzle[:2] for puzzle in puzzles] == [
+        ('boards.txt:1', SAMPLE_BOARD), ('boards.txt:14', SAMPLE_BOARD)]
+    with patch('main.parse_board') as parse_board:
+        results = list(batch.solve_batch(puzzles))
+    parse_board.assert_not_called()
+    assert [result['cost'] for result in results] == [220, 220]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_solve_batch(workers):
+    """Test results come back in input order with the optimal costs."""
+    puzzles = [(name, text, None) for name, text, _ in BOARDS]
+    results = list(batch.solve_batch(puzzles, workers))
+    assert [result['id'] for result in results] == \
+        [name for name, _, _ in BOARDS]
+    for result, (_, _, cost) in zip(results, BOARDS):
+        assert result['cost'] == cost
+        assert result['moves'][-1][1] == cost
+        assert result['nodes_expanded'] > 0
+        assert result['stopped'] is None
+        assert result['lower_bound'] == cost
+        json.dumps(result)
+
+
+def test_solve_batch_bad_board(capsys):
+    """Test a board without a start gives an error result and the solver
+    output doesn't end up on stdout."""
+    results = list(batch.solve_batch(
+        [('bad', SAMPLE_BOARD.replace('S', '.'), None),
+         ('good', SAMPLE_BOARD, None)]))
+    assert results[0] == {'id': 'bad',
+                          'error': 'No start found (\'S\' on board)'}
+    assert results[1]['cost'] == 220
+    assert capsys.readouterr().out == ''
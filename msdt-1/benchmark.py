@@ -0,0 +1,241 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+
+import kernel
+from main import backends, peak_memory, solve_board
+from puzzles import generate_board, generate_corpus
+'''
+Benchmark of the solver on a fixed corpus of generated boards, e.g.
+    python benchmark.py --save before.json
+    (change the solver)
+    python benchmark.py --baseline before.json
+    python benchmark.py --scaling 10 20 30 40
+
+The corpus file holds the generate_board arguments of every board and its
+recorded optimal cost; --record generates and solves a new one. Every
+board is solved in a fresh process so its peak memory can be measured,
+the cost is checked against the recorded one, and the time, nodes and
+peak memory are printed, with their ratio to a saved baseline.
+The first line tells if the mypyc build of kernel.py was used.
+The results are saved with the options and kernel they were run with,
+and a baseline run with others is warned about.
+The exit status is 1 if a cost differs from the recorded one, or with
+--max-ratio if the total time or nodes grew by more than that ratio
+over the baseline.
+--scaling benchmarks one board per size instead, to see how the time
+and memory grow with the board; their costs aren't checked.
+'''
+
+corpus_file = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'benchmark_corpus.json')
+metrics = ('elapsed', 'nodes_expanded', 'peak_mb')
+# Metrics whose total --max-ratio holds against the baseline
+regression_metrics = ('elapsed', 'nodes_expanded')
+
+
+# -------------------------------------------------------------------------------
+def record_corpus(path, seed, count):
+    """Generates count boards, solves them and writes the corpus file."""
+    corpus = [{'id': board_id, 'spec': spec, 'cost': None}
+              for board_id, spec, _ in generate_corpus(seed, count)]
+    # Solving in other processes keeps this one small, as the peak memory
+    # of a process carries over to the processes it starts
+    for entry, result in zip(corpus, run_benchmark(corpus, {})):
+        entry['cost'] = result['cost']
+    with open(path, 'w') as f:
+        json.dump(corpus, f, indent=4)
+        f.write('\n')
+    return corpus
+
+
+# -------------------------------------------------------------------------------
+def scaling_corpus(sizes, seed=0, monsters=3):
+    """Returns a corpus of one square board per size, without costs."""
+    return [{'id': '{0}x{0}'.format(size),
+             'spec': {'seed': seed, 'rows': size, 'cols': size,
+                      'monsters': monsters, 'wall_density': 0.1},
+             'cost': None} for size in sizes]
+
+
+# -------------------------------------------------------------------------------
+def run_board(entry, options):
+    """Solves one corpus board in this process and returns its result.
+
+    options are the keyword arguments of main.solve_board.
+    """
+    text = generate_board(**entry['spec'])
+    solution = solve_board(text, quiet=True, **options)
+    return {'id': entry['id'], 'cost': solution.cost,
+            'expected': entry['cost'],
+            'elapsed': solution.elapsed,
+            'nodes_expanded': solution.nodes_expanded,
+            'peak_mb': peak_memory()}
+
+
+# -------------------------------------------------------------------------------
+def run_benchmark(corpus, options):
+    """Yields the result of every corpus board, one fresh process each.
+
+    The processes are spawned rather than forked, so none of them starts
+    with the memory of this one.
+    """
+    with multiprocessing.get_context('spawn').Pool(
+            1, maxtasksperchild=1) as pool:
+        for entry in corpus:
+            yield pool.apply(run_board, (entry, options))
+
+
+# -------------------------------------------------------------------------------
+def compare(result, baseline):
+    """Returns the ratio of every metric of the result to the baseline one,
+    None for the metrics without a baseline."""
+    previous = baseline.get(result['id'], {})
+    return {metric: result[metric] / previous[metric]
+            if previous.get(metric) else None for metric in metrics}
+
+
+# -------------------------------------------------------------------------------
+def save_results(path, results, options):
+    """Writes the results and the options they were run with to path."""
+    with open(path, 'w') as f:
+        json.dump({'options': options, 'results': results}, f, indent=4)
+        f.write('\n')
+
+
+# -------------------------------------------------------------------------------
+def load_baseline(path):
+    """Returns the options and results saved to path by save_results.
+
+    The options are None for files saved with the results alone.
+    """
+    with open(path) as f:
+        saved = json.load(f)
+    if set(saved) == {'options', 'results'}:
+        return saved['options'], saved['results']
+    return None, saved
+
+
+# -------------------------------------------------------------------------------
+def option_changes(options, baseline_options):
+    """Returns 'name: baseline -> now' of every option that differs from
+    the baseline ones."""
+    return ['{}: {} -> {}'.format(name, baseline_options.get(name), value)
+            for name, value in sorted(options.items())
+            if baseline_options.get(name) != value]
+
+
+# -------------------------------------------------------------------------------
+def regressions(ratios, max_ratio):
+    """Returns the regression_metrics whose ratio exceeds max_ratio."""
+    return [metric for metric in regression_metrics
+            if ratios[metric] is not None and ratios[metric] > max_ratio]
+
+
+# -------------------------------------------------------------------------------
+def summarize(results):
+    """Returns the total time and nodes and the highest peak memory."""
+    results = results.values()
+    return {'id': 'total', 'cost': None, 'expected': None,
+            'elapsed': sum(r['elapsed'] for r in results),
+            'nodes_expanded': sum(r['nodes_expanded'] for r in results),
+            'peak_mb': max((r['peak_mb'] for r in results), default=0)}
+
+
+# -------------------------------------------------------------------------------
+def format_row(result, ratios):
+    """Returns the printed line of one board."""
+    if result['expected'] is None:
+        status = ''
+    elif result['cost'] == result['expected']:
+        status = 'ok'
+    else:
+        status = 'WRONG, expected {}'.format(result['expected'])
+    cells = ['{:10} {:>5} {:5}'.format(result['id'], str(result['cost']),
+                                       status)]
+    for metric, unit in zip(metrics, ('{:9.3f}s', '{:9} nodes', '{:7.1f}MB')):
+        cell = unit.format(result[metric])
+        if ratios[metric] is not None:
+            cell += ' ({:.2f}x)'.format(ratios[metric])
+        cells.append(cell)
+    return '  '.join(cells)
+
+
+# -------------------------------------------------------------------------------
+# Main
+# -------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the solver on a '
+                                                 'fixed corpus of boards.')
+    parser.add_argument('--corpus', default=corpus_file,
+                        help='corpus file, benchmark_corpus.json by default')
+    parser.add_argument('--record', type=int, nargs=2,
+                        metavar=('SEED', 'COUNT'),
+                        help='generate, solve and write a new corpus first')
+    parser.add_argument('--scaling', type=int, nargs='+', metavar='SIZE',
+                        help='benchmark one generated board of every size, '
+                             'inside the walls, instead of the corpus')
+    parser.add_argument('--search', choices=('dfs', 'astar'), default='dfs',
+                        help='search to benchmark, dfs by default')
+    parser.add_argument('--ordering', default='weapon',
+                        help='move ordering of the depth-first search')
+    parser.add_argument('--backend', choices=backends, default='python',
+                        help='way to find the attacks, python by default')
+    parser.add_argument('--save', help='JSON file to save the results to')
+    parser.add_argument('--baseline',
+                        help='JSON file of saved results to compare with')
+    parser.add_argument('--max-ratio', type=float,
+                        help='exit with status 1 if the total time or nodes '
+                             'exceed the baseline by more than this ratio, '
+                             'e.g. 1.1')
+    args = parser.parse_args()
+    if args.max_ratio is not None and not args.baseline:
+        parser.error('--max-ratio needs --baseline')
+
+    if args.scaling:
+        corpus = scaling_corpus(args.scaling)
+    elif args.record:
+        corpus = record_corpus(args.corpus, *args.record)
+    else:
+        with open(args.corpus) as f:
+            corpus = json.load(f)
+    options = {'search': args.search, 'ordering': args.ordering,
+               'backend': args.backend}
+    run_options = dict(options, kernel=kernel.compiled)
+    baseline = {}
+    if args.baseline:
+        baseline_options, baseline = load_baseline(args.baseline)
+        if baseline_options is None:
+            print('Warning: the baseline was saved without its options',
+                  file=sys.stderr)
+        else:
+            for change in option_changes(run_options, baseline_options):
+                print('Warning: the baseline was run with other options,',
+                      change, file=sys.stderr)
+
+    print('Kernel:', 'compiled' if kernel.compiled else 'pure Python')
+    results = {}
+    for result in run_benchmark(corpus, options):
+        results[result['id']] = result
+        print(format_row(result, compare(result, baseline)))
+    totals = summarize(results)
+    total_ratios = compare(totals, {'total': summarize(baseline)})
+    print(format_row(totals, total_ratios))
+
+    if args.save:
+        save_results(args.save, results, run_options)
+    failed = any(r['cost'] != r['expected'] for r in results.values()
+                 if r['expected'] is not None)
+    if args.max_ratio is not None:
+        for metric in regressions(total_ratios, args.max_ratio):
+            print('Regression: total {} is {:.2f}x the baseline'.format(
+                metric, total_ratios[metric]))
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
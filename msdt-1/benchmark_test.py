@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+import benchmark
+import main
+import puzzles
+
+
+with open(benchmark.corpus_file) as f:
+    CORPUS = json.load(f)
+
+
+@pytest.mark.parametrize('entry', CORPUS, ids=[e['id'] for e in CORPUS])
+def test_corpus_costs(entry):
+    """Test the solver still finds the recorded cost of every corpus board
+    it can finish within a few thousand nodes."""
+    solution = main.solve_board(puzzles.generate_board(**entry['spec']),
+                                node_limit=5000)
+    if solution.stopped:
+        pytest.skip('too large for the test suite')
+    assert solution.cost == entry['cost']
+
+
+def test_run_benchmark():
+    """Test every board is solved and checked in a process of its own."""
+    results = list(benchmark.run_benchmark(CORPUS[:3], {'search': 'astar'}))
+    assert [r['id'] for r in results] == [e['id'] for e in CORPUS[:3]]
+    for result, entry in zip(results, CORPUS):
+        assert result['cost'] == result['expected'] == entry['cost']
+        assert result['nodes_expanded'] > 0
+        assert result['peak_mb'] > 0
+
+
+def test_compare():
+    """Test the metrics are compared to the baseline as ratios."""
+    result = {'id': 'a', 'elapsed': 2.0, 'nodes_expanded': 50, 'peak_mb': 30}
+    baseline = {'a': {'elapsed': 1.0, 'nodes_expanded': 100, 'peak_mb': 0}}
+    assert benchmark.compare(result, baseline) == \
+        {'elapsed': 2.0, 'nodes_expanded': 0.5, 'peak_mb': None}
+    assert benchmark.compare(result, {}) == dict.fromkeys(benchmark.metrics)
+
+
+def test_summarize():
+    """Test time and nodes add up and the peak memory is the highest."""
+    results = {'a': {'elapsed': 1.5, 'nodes_expanded': 10, 'peak_mb': 20},
+               'b': {'elapsed': 0.5, 'nodes_expanded': 5, 'peak_mb': 30}}
+    totals = benchmark.summarize(results)
+    assert (totals['elapsed'], totals['nodes_expanded'], totals['peak_mb']) \
+        == (2.0, 15, 30)
+
+
+def test_scaling_corpus():
+    """Test the scaling boards grow with the sizes and aren't checked."""
+    corpus = benchmark.scaling_corpus([10, 30])
+    assert [entry['id'] for entry in corpus] == ['10x10', '30x30']
+    result = next(benchmark.run_benchmark(corpus[1:], {}))
+    assert result['cost'] is not None and result['expected'] is None
+    row = benchmark.format_row(result, dict.fromkeys(benchmark.metrics))
+    assert 'WRONG' not in row and ' ok ' not in row
+    text = puzzles.generate_board(**corpus[1]['spec'])
+    assert len(text.split()) == 34
+
+
+def test_save_load_baseline(tmp_path):
+    """Test the results are saved with their options and older files of
+    results alone still load."""
+    results = {'a': {'elapsed': 1.0, 'nodes_expanded': 10, 'peak_mb': 20}}
+    options = {'search': 'dfs', 'ordering': 'weapon', 'backend': 'python',
+               'kernel': False}
+    path = str(tmp_path / 'baseline.json')
+    benchmark.save_results(path, results, options)
+    assert benchmark.load_baseline(path) == (options, results)
+    with open(path, 'w') as f:
+        json.dump(results, f)
+    assert benchmark.load_baseline(path) == (None, results)
+
+
+def test_option_changes():
+    """Test the options that differ from the baseline are listed."""
+    baseline = {'search': 'dfs', 'ordering': 'weapon', 'backend': 'python'}
+    assert benchmark.option_changes(dict(baseline), baseline) == []
+    options = dict(baseline, ordering='history', kernel=True)
+    assert benchmark.option_changes(options, baseline) == \
+        ['kernel: None -> True', 'ordering: weapon -> history']
+
+
+def test_regressions():
+    """Test only time and nodes above the ratio count as regressions."""
+    ratios = {'elapsed': 1.2, 'nodes_expanded': 1.05, 'peak_mb': 3.0}
+    assert benchmark.regressions(ratios, 1.1) == ['elapsed']
+    assert benchmark.regressions(ratios, 1.0) == \
+        ['elapsed', 'nodes_expanded']
+    assert benchmark.regressions(dict.fromkeys(ratios), 1.0) == []
@@ -0,0 +1,189 @@
+import hashlib
+import sqlite3
+import time
+
+from kernel import apply_attack
+from main import Solution, Solver, solve_board, start_node
+'''
+Persistent cache of optimal solutions in an SQLite file, e.g.
+    cache = SolutionCache('solutions.db')
+    solution = solve_cached(cache, text)
+
+A board is identified by a fingerprint of its cells, its width and the
+knight's floor region, since the knight can walk anywhere in it before
+the first attack. Every finished solution is stored for the board and,
+as the rest of an optimal path is optimal for the board it starts from,
+for every board along its path, so later boards that are positions of
+an earlier solve are answered from the cache too. Solutions of searches
+stopped by a budget or found with dominance pruning aren't proven
+optimal and are not stored.
+
+A board only stores its first move and the fingerprint of the board the
+move leads to, so the path of a board is read back by following them to
+the cleared board, and the cache grows by one small row per board.
+
+The cache keeps at most max_entries boards and max_mb megabytes of
+database pages, and evicts the least recently used boards beyond them.
+'''
+
+
+# -------------------------------------------------------------------------------
+class SolutionCache:
+    """
+    Maps board fingerprints to the first move of an optimal path in an
+    SQLite database.
+
+    Each row holds the cost of the board, the action and loc of its first
+    attack and the fingerprint of the board after it; the cleared board
+    has no attack and its next fingerprint is NULL.
+
+    Attributes
+        connection: the sqlite3 connection.
+        max_entries: number of boards kept, the least recently used
+            ones are deleted beyond it.
+        max_mb: megabytes of database pages in use kept, the least
+            recently used boards are deleted beyond it; None for no limit.
+        solver: Solver used to find the knight's region of a board.
+    """
+
+    def __init__(self, path, max_entries=1000000, max_mb=100):
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS boards ('
+            'fingerprint BLOB PRIMARY KEY, cost INTEGER, action TEXT, '
+            'loc INTEGER, next BLOB, used REAL) WITHOUT ROWID')
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS boards_used ON boards (used)')
+        self.connection.commit()
+        self.max_entries = max_entries
+        self.max_mb = max_mb
+        self.solver = Solver()
+
+    def close(self):
+        """Closes the database."""
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM boards').fetchone()[0]
+
+    def size_mb(self):
+        """Returns the megabytes of database pages in use; the pages freed
+        by deleted rows are reused before the file grows."""
+        execute = self.connection.execute
+        pages = execute('PRAGMA page_count').fetchone()[0] - \
+            execute('PRAGMA freelist_count').fetchone()[0]
+        return pages * execute('PRAGMA page_size').fetchone()[0] / 2 ** 20
+
+    def fingerprint(self, state, loc):
+        """Returns the fingerprint of the board with the knight on loc."""
+        region = self.solver.knight_region(state, loc)
+        digest = hashlib.sha256(state)
+        digest.update('{}:{}'.format(self.solver.cols, region[0]).encode())
+        return digest.digest()
+
+    def get(self, text):
+        """Returns the cached Solution of the board text, None if unknown.
+
+        The path is rebuilt by making the stored attack of every board on
+        it; if a board along it was evicted, the board is unknown.
+        Raises ValueError if there is no 'S' on the board.
+        """
+        time_start = time.time()
+        root = self.solver.load(text)
+        templates = {template[0]: template
+                     for weapon_templates in self.solver.attack_templates
+                     for template in weapon_templates}
+        fingerprint = self.fingerprint(root[0], root[3])
+        fingerprints = []
+        node = root
+        nodes = [root]
+        cost = None
+        while fingerprint is not None:
+            row = self.connection.execute(
+                'SELECT cost, action, loc, next FROM boards '
+                'WHERE fingerprint = ?', (fingerprint,)).fetchone()
+            # A board along the path was evicted or solved again since
+            if row is None or \
+                    cost is not None and node[2] + row[0] != cost:
+                return None
+            fingerprints.append(fingerprint)
+            left, action, loc, fingerprint = row
+            if cost is None:
+                cost = left
+            if fingerprint is not None:
+                _, cost_add, targets, push = templates[action][:4]
+                state = apply_attack(node[0], loc, targets, push)[0]
+                node = path_node(state, action, node[2] + cost_add, loc,
+                                 node)
+                nodes.append(node)
+        used = time.time()
+        self.connection.executemany(
+            'UPDATE boards SET used = ? WHERE fingerprint = ?',
+            [(used, fingerprint) for fingerprint in fingerprints])
+        self.connection.commit()
+        return Solution(cost=cost, path=nodes, cols=self.solver.cols,
+                        lower_bound=cost,
+                        elapsed=time.time() - time_start, cached=True)
+
+    def put(self, text, solution):
+        """Stores a proven optimal Solution of the board text and of every
+        board along its path; other solutions, whose lower bound isn't
+        their cost, are not stored."""
+        if solution.cost is None or solution.lower_bound != solution.cost:
+            return
+        self.solver.load(text)
+        path = solution.path
+        fingerprints = [self.fingerprint(node[0], node[3]) for node in path]
+        # The first attack of every board is the action and loc of the
+        # next node, the cleared board has none
+        attacks = [(node[1], node[3]) for node in path[1:]] + [(None, None)]
+        used = time.time()
+        rows = [(fingerprint, solution.cost - node[2], action, loc,
+                 next_fingerprint, used)
+                for fingerprint, node, (action, loc), next_fingerprint
+                in zip(fingerprints, path, attacks, fingerprints[1:] + [None])]
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO boards VALUES (?, ?, ?, ?, ?, ?)',
+            rows)
+        self.evict()
+        self.connection.commit()
+
+    def evict(self):
+        """Deletes the least recently used boards beyond max_entries and
+        max_mb.
+
+        The rows are all about the same size, so beyond max_mb the share
+        of the boards that is over it is deleted. The pages of deleted rows
+        are only partly freed, but later rows reuse their space.
+        """
+        count = len(self)
+        extra = count - self.max_entries
+        if self.max_mb is not None:
+            size = self.size_mb()
+            if size > self.max_mb:
+                extra = max(extra, int(count * (size - self.max_mb) / size)
+                            + 1)
+        if extra > 0:
+            self.connection.execute(
+                'DELETE FROM boards WHERE fingerprint IN ('
+                'SELECT fingerprint FROM boards ORDER BY used LIMIT ?)',
+                (extra,))
+
+
+# -------------------------------------------------------------------------------
+def path_node(state, action, cost, loc, parent):
+    """Returns the node of a cached path step, see Solver."""
+    node = start_node(state, loc)
+    return state, action, cost, loc, parent, node[5], node[6]
+
+
+# -------------------------------------------------------------------------------
+def solve_cached(cache, text, **options):
+    """Returns the cached Solution of the board text, or solves it with
+    main.solve_board and the options and caches the result."""
+    solution = cache.get(text)
+    if solution is None:
+        solution = solve_board(text, **options)
+        cache.put(text, solution)
+    return solution
@@ -0,0 +1,107 @@
+from unittest.mock import patch
+
+import pytest
+
+import main
+import puzzles
+from cache import SolutionCache, solve_cached
+from main_test import SAMPLE_BOARD, SMALL_BOARDS, board_text
+
+
+def test_miss_then_hit(tmp_path):
+    """Test a solved board is read back with the same cost and moves."""
+    cache = SolutionCache(str(tmp_path / 'cache.db'))
+    assert cache.get(SAMPLE_BOARD) is None
+    solved = solve_cached(cache, SAMPLE_BOARD)
+    assert not solved.cached
+    with patch('cache.solve_board') as solve_board:
+        cached = solve_cached(cache, SAMPLE_BOARD)
+    solve_board.assert_not_called()
+    assert cached.cached
+    assert cached.cost == solved.cost == 220
+    assert cached.lower_bound == 220
+    assert cached.nodes_expanded == 0
+    assert cached.moves() == solved.moves()
+
+
+def test_sub_position_hit(tmp_path):
+    """Test the boards along a solution's path are cached with its suffix."""
+    cache = SolutionCache(str(tmp_path / 'cache.db'))
+    solved = solve_cached(cache, SAMPLE_BOARD)
+    assert len(cache) == len(solved.path)
+    for node in solved.path[1:]:
+        text = board_text(node, solved.cols)
+        cached = cache.get(text)
+        assert cached.cost == solved.cost - node[2]
+        assert cached.cost == main.solve_board(text).cost
+        assert cached.path[-1][0] == solved.path[-1][0]
+
+
+def test_same_region_hit(tmp_path):
+    """Test the start anywhere in the knight's floor region is a hit."""
+    text = SMALL_BOARDS[0].values[0]
+    cache = SolutionCache(str(tmp_path / 'cache.db'))
+    solve_cached(cache, text)
+    moved = text.replace('S', '.').replace('WW......WW', 'WWS.....WW', 1)
+    cached = cache.get(moved)
+    assert cached.cost == SMALL_BOARDS[0].values[1]
+
+
+@pytest.mark.parametrize('options', [{'node_limit': 1}, {'dominance': True}])
+def test_unproven_not_stored(tmp_path, options):
+    """Test solutions stopped by a budget or found with dominance pruning
+    are not cached, so a later exact solve isn't served from them."""
+    cache = SolutionCache(str(tmp_path / 'cache.db'))
+    solution = solve_cached(cache, SAMPLE_BOARD, **options)
+    assert solution.lower_bound != solution.cost
+    assert len(cache) == 0
+    assert not solve_cached(cache, SAMPLE_BOARD).cached
+
+
+def test_eviction(tmp_path):
+    """Test the least recently used boards are evicted beyond the limit."""
+    cache = SolutionCache(str(tmp_path / 'cache.db'), max_entries=3)
+    solved = solve_cached(cache, SAMPLE_BOARD)
+    assert len(cache) == 3
+    for param in SMALL_BOARDS:
+        solve_cached(cache, param.values[0])
+        assert len(cache) == 3
+    assert cache.get(SAMPLE_BOARD) is None
+    assert len(solved.path) > 3
+
+
+def test_size_limit(tmp_path):
+    """Test boards are evicted to keep the database pages near max_mb."""
+    cache = SolutionCache(str(tmp_path / 'cache.db'), max_mb=0.03)
+    stored = 0
+    for seed in range(40):
+        text = puzzles.generate_board(seed, rows=5, cols=5, monsters=4)
+        stored += len(solve_cached(cache, text, quiet=True).path)
+        assert cache.size_mb() < 0.04
+        assert cache.get(text) is not None
+    assert len(cache) < stored
+
+
+def test_path_follows_boards(tmp_path):
+    """Test a board is stored as one row and its path is rebuilt from the
+    rows of the boards after it, so a missing one makes it unknown."""
+    cache = SolutionCache(str(tmp_path / 'cache.db'))
+    solved = solve_cached(cache, SAMPLE_BOARD)
+    middle = solved.path[len(solved.path) // 2]
+    cache.connection.execute('DELETE FROM boards WHERE fingerprint = ?',
+                             (cache.fingerprint(middle[0], middle[3]),))
+    assert len(cache) == len(solved.path) - 1
+    assert cache.get(SAMPLE_BOARD) is None
+    after = solved.path[len(solved.path) // 2 + 1]
+    assert cache.get(board_text(after, solved.cols)).cost == \
+        solved.cost - after[2]
+
+
+def test_persistent(tmp_path):
+    """Test the cache is read back after reopening the file."""
+    path = str(tmp_path / 'cache.db')
+    cache = SolutionCache(path)
+    solve_cached(cache, SAMPLE_BOARD)
+    cache.close()
+    cache = SolutionCache(path)
+    assert cache.get(SAMPLE_BOARD).cost == 220
@@ -0,0 +1,132 @@
+from typing import AbstractSet, Final, List, Sequence, Tuple
+'''
+Move generation kernel of the solver in main.py.
+
+The functions here are the innermost loops of a search: finding the
+attacks of a node, making one and filling a floor region. They only
+read their arguments and return new values, and they are fully typed,
+so the module can be compiled with mypyc into an extension module:
+    pip install mypy
+    mypyc kernel.py
+The built kernel.*.so is then imported instead of this file; without it
+the solver runs this file as plain Python. See benchmark.py to compare.
+'''
+
+floor: Final = 0
+monster_blue: Final = 1
+monster_purple: Final = 2
+monster_red: Final = 3
+wall: Final = 4
+# True if this is the module built by mypyc
+compiled: Final = not __file__.endswith('.py')
+
+# (action, cost, targets, push, min_hits, blockers, lone_hits),
+# see main.build_attack_templates
+Template = Tuple[str, int, Tuple[int, ...], int, int, Tuple[int, ...],
+                 Tuple[Tuple[int, int], ...]]
+
+
+# -------------------------------------------------------------------------------
+def check_attack(state: bytes, loc: int, template: Template) -> bool:
+    """Checks if attacking with the template from loc is worth it.
+
+    An attack is made if at least min_hits of its targets hold monsters
+    and none of its blockers is floor. With fewer hits it is still made
+    if one of its lone_hits targets holds the monster and the paired cell
+    is not floor.
+    """
+    targets = template[2]
+    min_hits = template[4]
+    hits = 0
+    for t in targets:
+        if floor < state[loc + t] < wall:
+            hits += 1
+    if hits < min_hits:
+        for t, b in template[6]:
+            if floor < state[loc + t] < wall and state[loc + b] != floor:
+                break
+        else:
+            return False
+    for b in template[5]:
+        if state[loc + b] == floor:
+            return False
+    return True
+
+
+# -------------------------------------------------------------------------------
+def find_attacks(state: bytes, monster_cells: AbstractSet[int],
+                 labels: Sequence[int], label: int,
+                 attack_templates: Sequence[Sequence[Template]]
+                 ) -> List[Tuple[int, Template]]:
+    """Returns (loc, template) of every attack the knight can make.
+
+    Every attack hits at least one monster, so instead of trying every
+    template on every reachable floor, the templates are anchored on
+    the monsters: a template can hit monster m from loc = m - target,
+    which is kept if loc has the label of the knight's region and
+    check_attack allows it. The attacks are in template order.
+    """
+    attacks = []
+    for weapon_templates in attack_templates:
+        for template in weapon_templates:
+            tried = set()
+            for t in template[2]:
+                for m in monster_cells:
+                    loc = m - t
+                    if labels[loc] == label and loc not in tried:
+                        tried.add(loc)
+                        if check_attack(state, loc, template):
+                            attacks.append((loc, template))
+    return attacks
+
+
+# -------------------------------------------------------------------------------
+def apply_attack(state: bytes, loc: int, targets: Sequence[int], push: int
+                 ) -> Tuple[bytes, int, List[Tuple[int, int]]]:
+    """Makes the attack on the targets from loc and returns the new state,
+    the number of monsters hit and the (from, to) cells of every monster
+    hit, to is -1 if it died.
+
+    Every monster hit loses one health and is pushed one cell away from
+    the knight if that cell is floor. The board is copied once into a
+    bytearray, changed in place and frozen back to bytes, so the state
+    passed in is never touched.
+    """
+    cells = bytearray(state)
+    hits = 0
+    moves = []
+    for a in targets:
+        a += loc
+        if floor < cells[a] < wall:
+            mon = cells[a] - 1
+            hits += 1
+            if cells[a + push] == floor:
+                cells[a + push] = mon
+                cells[a] = floor
+                moves.append((a, a + push if mon else -1))
+            else:
+                cells[a] = mon
+                moves.append((a, a if mon else -1))
+    return bytes(cells), hits, moves
+
+
+# -------------------------------------------------------------------------------
+def fill_region(state: bytes, loc: int, steps: Sequence[int]) -> List[int]:
+    """Returns the cells of the floor region of loc, loc first.
+
+    Iterative flood fill over flat indices on a copy of the board, where
+    every cell reached is walled off so it isn't entered again.
+    """
+    cells = bytearray(state)
+    cells[loc] = wall
+    region = [loc]
+    # The loop also visits the cells appended while it runs
+    i = 0
+    while i < len(region):
+        cell = region[i]
+        for step in steps:
+            if cells[cell + step] == floor:
+                cells[cell + step] = wall
+                region.append(cell + step)
+        i += 1
+    return region
@@ -0,0 +1,62 @@
+import pytest
+
+import kernel
+import main
+from main_test import SAMPLE_BOARD, SMALL_BOARDS
+
+
+def test_apply_attack():
+    """Test hit monsters lose health, are pushed onto floor and die."""
+    state, loc, cols = main.parse_board(SAMPLE_BOARD)
+    red = state.index(kernel.monster_red)
+    # Dagger from below the red pushes it up onto floor
+    targets, push = (-cols,), -cols
+    child, hits, moves = kernel.apply_attack(state, red + cols, targets, push)
+    assert hits == 1
+    assert moves == [(red, red - cols)]
+    assert child[red] == kernel.floor
+    assert child[red - cols] == kernel.monster_purple
+    assert state[red] == kernel.monster_red
+    # A blue dies where it stands
+    blue = bytearray(state)
+    blue[red] = kernel.monster_blue
+    child, hits, moves = kernel.apply_attack(bytes(blue), red + cols, targets,
+                                             push)
+    assert moves == [(red, -1)]
+    assert child[red] == child[red - cols] == kernel.floor
+
+
+@pytest.mark.parametrize('text', [SAMPLE_BOARD] +
+                         [param.values[0] for param in SMALL_BOARDS])
+def test_find_attacks(text):
+    """Test the attacks anchored on the monsters are exactly the allowed
+    attacks from every cell of the knight's region."""
+    solver = main.Solver()
+    root = solver.load(text)
+    labels, label = solver.get_floor_region(root[0], root[3])
+    attacks = kernel.find_attacks(root[0], root[6], labels, label,
+                                  solver.attack_templates)
+    region = solver.knight_region(root[0], root[3])
+    expected = {(loc, template)
+                for weapon_templates in solver.attack_templates
+                for template in weapon_templates for loc in region
+                if kernel.check_attack(root[0], loc, template) and
+                any(kernel.floor < root[0][loc + t] < kernel.wall
+                    for t in template[2])}
+    assert len(attacks) == len(set(attacks))
+    assert set(attacks) == expected
+
+
+def test_fill_region():
+    """Test the fill returns the floor cells reachable from loc only, once
+    each, and leaves the board as it was."""
+    state, loc, cols = main.parse_board(SMALL_BOARDS[2].values[0])
+    steps = (-cols, 1, cols, -1)
+    region = kernel.fill_region(state, loc, steps)
+    assert region[0] == loc
+    assert len(region) == len(set(region)) == 5
+    assert all(state[cell] == kernel.floor for cell in region)
+    assert not any(state[cell + step] == kernel.floor and
+                   cell + step not in region
+                   for cell in region for step in steps)
+    assert state == main.parse_board(SMALL_BOARDS[2].values[0])[0]
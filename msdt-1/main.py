@@ -1,6 +1,33 @@
+import argparse
+import bisect
+import cProfile
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import random
 import sys
 import time
-import copy
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from operator import mul
+
+from kernel import (apply_attack, fill_region, find_attacks, floor,
+                    monster_blue, monster_purple, monster_red, wall)
+from transposition import TranspositionTable
+
+try:
+    import resource
+except ImportError:  # Not on Windows, where peak_memory is 0
+    resource = None
+
+try:
+    import numpy
+except ImportError:  # Only the 'numpy' backend needs it
+    numpy = None
 '''
 Example of test.txt file (double walls around the 8x8 or ?x? grid is required):
 WWWWWWWWWWWW
@@ -15,496 +42,1390 @@ WW...S....WW
 WW........WW
 WWWWWWWWWWWW
 WWWWWWWWWWWW
+
+Boards are stored as flat immutable bytes objects, one byte per cell
+in row-major order, where the value of a monster cell is its health:
+floor = 0, blue = 1, purple = 2, red = 3 and wall = 4. Cells are addressed
+by their flat index, so the neighbours of a cell are at -cols, +1, +cols
+and -1 and the double wall keeps every offset used below on the board.
+
+The module can be used as a library; a Solver keeps no state between
+boards except its caches, so one instance can be reused for many boards:
+    solver = Solver()
+    solution = solver.solve_board(text)
+    print(solution.cost, solution.moves())
 '''
 
+# Cell values floor, monster_blue, monster_purple, monster_red and wall
+# come from kernel.py
+start = 'S'
+
+# Weapons for a knight facing north, offsets are (row, col) from the knight:
+# name, cost, targets, min hits, blockers, lone hits
+# - targets are hit in order and pushed one cell away from the knight
+# - min hits is the number of monsters the targets must hold; fewer hits
+#   are covered by a cheaper weapon
+# - blockers must not be floor, or the attack could not be made
+# - lone hits are (target, cell) pairs that allow a single hit anyway
+#   when the cell is not floor
+weapons = (
+    # Only swing if two or three monsters hit or if one diagonal
+    # without space for dagger swing
+    # and potential push (results in same effect for cheaper)
+    ('Sword', 80, ((-1, -1), (-1, 0), (-1, 1)), 2, (),
+     (((-1, -1), (0, -1)), ((-1, 1), (0, 1)))),
+    # There's no point in using a spear attack unless it's hitting
+    # 2 monsters. If only one next to knight, dagger is cheaper.
+    # If only one two away from knight, bow is cheaper.
+    ('Spear', 70, ((-2, 0), (-1, 0)), 2, (), ()),
+    ('Dagger', 50, ((-1, 0),), 1, (), ()),
+    ('Bow', 60, ((-2, 0),), 1, ((-1, 0),), ()),
+)
+# Orders search_dfs can try the attacks of a node in, see Solver.order
+orderings = ('weapon', 'efficiency', 'history')
+# Ways Solver.expand can find the attacks of a node
+backends = ('python', 'numpy')
+
+# Rotations of a north-facing (row, col) offset to every direction
+directions = (
+    ('North', lambda r, c: (r, c)),
+    ('East', lambda r, c: (c, -r)),
+    ('South', lambda r, c: (-r, -c)),
+    ('West', lambda r, c: (-c, r)),
+)
+
+# Byte translation tables between the board text and the flat state
+symbols = '.BPRW'
+cell_table = bytes.maketrans(b'.BPRWS', bytes([floor, monster_blue,
+                                               monster_purple, monster_red,
+                                               wall, floor]))
+symbol_table = bytes.maketrans(bytes(range(len(symbols))), symbols.encode())
+board_symbols = '.BPRWS'
+# Rows and columns of wall around the board
+wall_width = 2
+
+# Cost before any solution is found, the most a shared 'i' Value holds,
+# so even large boards cost less
+no_cost = 2 ** 31 - 1
+# Seconds between the memory reads of Solver.expand, see current_memory
+memory_interval = 0.1
+# Solver of a worker process of Solver.search_parallel
+worker_solver = None
+
 
 # -------------------------------------------------------------------------------
-def print_history(history):
-    print('')
-    for h in history:
-        print('Action: {} / Cost: {}'.format(h[1], h[2]))
-        state = h[0]
-        loc = h[3]
-        state[loc[0]][loc[1]] = '*'
-        for m in h[0]:
-            print(''.join(m))
-        print('')
-        state[loc[0]][loc[1]] = '.'
-    print('------------------------------------------')
+class BoardError(ValueError):
+    """
+    Malformed board text.
+
+    Attributes
+        line: line number of the error counted from 1, None if the error
+            is about the whole board.
+        column: column of the error counted from 1, None if the error
+            is about the whole line.
+    """
+
+    def __init__(self, message, line=None, column=None):
+        if line is not None:
+            where = 'Line {}'.format(line)
+            if column is not None:
+                where += ', column {}'.format(column)
+            message = '{}: {}'.format(where, message)
+        super().__init__(message)
+        self.line = line
+        self.column = column
 
 
 # -------------------------------------------------------------------------------
-def solve(history):
-    """Recursive function that solves the board.
-    history: list of lists
-        [0] state: list of lists that is the board matrix
-        [1] action: string
-        [2] cost: integer
-        [3] current location list: [r, c]
+@dataclass
+class Stats:
+    """
+    Counters and timers of a search.
+
+    Attributes
+        nodes_expanded: number of nodes expanded.
+        duplicates: children dropped by the transposition table.
+        dominated: nodes skipped by dominance pruning.
+        bound_prunes: nodes cut off by the bound.
+        moves_generated: maps a weapon to the number of its attacks made.
+        flood_fills: number of floor regions filled.
+        flood_fill_time: seconds spent filling floor regions.
+        peak_table_size: most entries in the transposition table,
+            the largest table of any process with workers.
+        elapsed: seconds the search took.
     """
-    global cost_best
-    global history_best
-    global bails
+    nodes_expanded: int = 0
+    duplicates: int = 0
+    dominated: int = 0
+    bound_prunes: int = 0
+    moves_generated: dict = field(default_factory=dict)
+    flood_fills: int = 0
+    flood_fill_time: float = 0.0
+    peak_table_size: int = 0
+    elapsed: float = 0.0
+
+    def nodes_per_second(self):
+        """Returns the nodes expanded per second of the search."""
+        return self.nodes_expanded / self.elapsed if self.elapsed else 0.0
+
+    def add(self, other):
+        """Adds the counters of the search of another process."""
+        self.nodes_expanded += other.nodes_expanded
+        self.duplicates += other.duplicates
+        self.dominated += other.dominated
+        self.bound_prunes += other.bound_prunes
+        for weapon, count in other.moves_generated.items():
+            self.moves_generated[weapon] = \
+                self.moves_generated.get(weapon, 0) + count
+        self.flood_fills += other.flood_fills
+        self.flood_fill_time += other.flood_fill_time
+        self.peak_table_size = max(self.peak_table_size,
+                                   other.peak_table_size)
+
+    def to_json(self):
+        """Returns the stats with the nodes per second as a JSON object."""
+        stats = asdict(self)
+        stats['nodes_per_second'] = self.nodes_per_second()
+        return json.dumps(stats, indent=4)
 
-    cost = history[-1][2]
 
-    # print_history(history)
-    # raw_input('Continue')
+# -------------------------------------------------------------------------------
+@dataclass
+class Solution:
+    """
+    The best solution found for a board.
+
+    Attributes
+        cost: total cost of the attacks, None if no solution was found.
+        path: nodes from the start to the cleared board, see Solver.
+        cols: width of the board, to convert the flat cell indices.
+        nodes_expanded: number of nodes the search expanded.
+        elapsed: seconds the search took.
+        stopped: None if the search finished, otherwise the budget that
+            ran out: 'time', 'nodes' or 'memory'. The cost is then the
+            best found so far rather than the proven optimum.
+        lower_bound: proven lower bound of the optimal cost, equal to
+            the cost if the search finished; None if nothing is proven,
+            as with dominance pruning, see Solver.is_dominated, or for
+            an incumbent of a search still running.
+        incumbents: (cost, nodes expanded, seconds) of every better
+            solution in the order the search found them.
+        stats: counters and timers of the search.
+        cached: the solution was read from a cache instead of searched,
+            see cache.py.
+    """
+    cost: int = None
+    path: list = field(default_factory=list)
+    cols: int = 0
+    nodes_expanded: int = 0
+    elapsed: float = 0.0
+    stopped: str = None
+    lower_bound: int = None
+    incumbents: list = field(default_factory=list)
+    stats: Stats = field(default_factory=Stats)
+    cached: bool = False
+
+    def gap(self):
+        """Returns how much the cost may exceed the optimum, None without
+        a solution or lower bound."""
+        if self.cost is None or self.lower_bound is None:
+            return None
+        return self.cost - self.lower_bound
+
+    def moves(self):
+        """Returns (action, cost, (row, col)) of every attack in order."""
+        return [(node[1], node[2], divmod(node[3], self.cols))
+                for node in self.path[1:]]
 
-    # Scan for remaining monster health
-    health_left = monster_health_remaining(history)
-    if not health_left:
-        if cost_best > cost:
-            cost_best = cost
-            history_best = history
 
-            # print_history(history)
+# -------------------------------------------------------------------------------
+class Solver:
+    """Knight and monsters board solver. Its searches work on node tuples of
+    (state, action, cost, loc, parent, health left, monster cells), see
+    start_node; load resets it for the next board."""
+
+    def __init__(self, floor_cache_mb=64, symmetry=False,
+                 ordering='weapon', table_mb=None, backend='python',
+                 dominance=False, quiet=False):
+        if ordering not in orderings:
+            raise ValueError('Unknown move ordering: {}'.format(ordering))
+        if backend not in backends:
+            raise ValueError('Unknown backend: {}'.format(backend))
+        if backend == 'numpy' and numpy is None:
+            raise ImportError('The numpy backend needs NumPy installed')
+        self.backend = backend
+        self.cols = 0
+        self.steps = ()
+        self.attack_templates = ()
+        self.template_reach = 0
+        self.table_mb = table_mb
+        self.transposition_table = {} if table_mb is None \
+            else TranspositionTable(table_mb)
+        self.symmetry = symmetry
+        self.symmetries = ()
+        self.dominance = dominance
+        self.dominance_table = {} if dominance else None
+        self.cell_keys = ()
+        self.floor_cache = {}
+        self.floor_cache_mb = floor_cache_mb
+        self.floor_cache_bytes = 0
+        self.cost_best = no_cost
+        self.node_best = None
+        self.bails = 0
+        self.nodes_expanded = 0
+        self.duplicates = 0
+        self.dominated = 0
+        self.moves_generated = {}
+        self.flood_fills = 0
+        self.flood_fill_time = 0.0
+        self.worker_stats = Stats()
+        self.shared_cost = None
+        self.deadline = None
+        self.node_limit = None
+        self.memory_limit = None
+        self.memory_check = 0.0
+        self.stopped = None
+        self.finished = False
+        self.lower_bound = no_cost
+        self.on_incumbent = None
+        self.quiet = quiet
+        self.ordering = ordering
+        self.history = {}
+        self.killers = {}
+        self.cutoff_depth = None
+        self.incumbents = []
+        self.time_start = 0.0
+
+    def load(self, text, parsed=None):
+        """Parses the board text and clears the results of any previous search.
+
+        Returns the start node. Raises BoardError if the board is
+        malformed or there is no 'S' on it, see parse_board.
+        parsed is the parse_board result of the text if it was already
+        checked, e.g. by read_boards, so it isn't parsed again.
+        """
+        state, loc_start, self.cols = parsed or parse_board(text)
+        self.steps = (-self.cols, 1, self.cols, -1)
+        self.attack_templates = build_attack_templates(self.cols)
+        self.template_reach = max(
+            abs(offset) for weapon_templates in self.attack_templates
+            for template in weapon_templates
+            for offset in itertools.chain(template[2], template[5],
+                                          *template[6]))
+        self.symmetries = ()
+        mirrors = board_symmetries(state, self.cols) if self.symmetry else ()
+        if mirrors:
+            self.symmetries = tuple(
+                (tuple(4 ** cell for cell in mirror), mirror)
+                for mirror in (tuple(range(len(state))),) + mirrors)
+        self.transposition_table.clear()
+        if self.dominance:
+            self.dominance_table.clear()
+            self.cell_keys = build_cell_keys(len(state))
+        self.floor_cache.clear()
+        self.floor_cache_bytes = 0
+        self.cost_best = no_cost
+        self.node_best = None
+        self.nodes_expanded = 0
+        self.reset_stats()
+        self.memory_check = 0.0
+        self.stopped = None
+        self.finished = False
+        self.lower_bound = no_cost
+        self.history.clear()
+        self.killers.clear()
+        self.cutoff_depth = None
+        self.incumbents = []
+        self.time_start = time.time()
+        if loc_start == -1:
+            raise BoardError('No start found (\'S\' on board)')
+        return start_node(state, loc_start)
+
+    def solve_board(self, text, search='dfs', workers=1, split_depth=1,
+                    time_limit=None, node_limit=None, memory_limit=None,
+                    on_incumbent=None, parsed=None):
+        """Solves the board text and returns its Solution.
+
+        search is 'dfs' or 'astar'; workers > 1 runs the depth-first
+        search over a process pool, see search_parallel.
+        The search stops with the best solution found so far once it took
+        time_limit seconds, expanded node_limit nodes or the process grew
+        to memory_limit MB; None is no limit. With workers the node and
+        memory limits hold for each worker.
+        A* finds no solution before it finished, so a budget that runs out
+        leaves it with only the lower bound.
+        on_incumbent is called with the Solution of every better solution
+        found, e.g. to report progress or keep the last one; its lower
+        bound is None as the search hasn't proven it yet. With workers it
+        is only called as their subtrees finish, see search_parallel.
+        parsed is the parse_board result of the text, see load.
+        """
+        root = self.load(text, parsed)
+        if time_limit is not None:
+            self.deadline = self.time_start + time_limit
+        self.node_limit = node_limit
+        self.memory_limit = memory_limit
+        self.on_incumbent = on_incumbent
+        try:
+            if search == 'astar':
+                self.search_astar(root)
+            elif workers > 1:
+                self.search_parallel(root, text, workers, split_depth)
+            else:
+                self.search_dfs(root)
+            self.finished = True
+        finally:
+            self.deadline = None
+            self.node_limit = None
+            self.memory_limit = None
+            self.on_incumbent = None
+        return self.solution()
+
+    def reset_stats(self):
+        """Zeroes the counters of stats, except nodes_expanded."""
+        self.bails = 0
+        self.duplicates = 0
+        self.dominated = 0
+        self.moves_generated = {}
+        self.flood_fills = 0
+        self.flood_fill_time = 0.0
+        self.worker_stats = Stats()
+
+    def stats(self):
+        """Returns the Stats of the search so far."""
+        stats = Stats(nodes_expanded=self.nodes_expanded,
+                      duplicates=self.duplicates,
+                      dominated=self.dominated,
+                      bound_prunes=self.bails,
+                      flood_fills=self.flood_fills,
+                      flood_fill_time=self.flood_fill_time,
+                      peak_table_size=len(self.transposition_table),
+                      elapsed=time.time() - self.time_start)
+        for action, count in self.moves_generated.items():
+            weapon = action.split()[0]
+            stats.moves_generated[weapon] = \
+                stats.moves_generated.get(weapon, 0) + count
+        # The nodes of the workers are in nodes_expanded already
+        nodes_expanded = stats.nodes_expanded
+        stats.add(self.worker_stats)
+        stats.nodes_expanded = nodes_expanded
+        return stats
+
+    def solution(self):
+        """Returns the Solution of the best solution found so far."""
+        solution = Solution(cols=self.cols,
+                            nodes_expanded=self.nodes_expanded,
+                            elapsed=time.time() - self.time_start,
+                            stopped=self.stopped,
+                            incumbents=list(self.incumbents),
+                            stats=self.stats())
+        if self.node_best is not None:
+            solution.cost = self.cost_best
+            solution.path = node_path(self.node_best)
+        # A budget that ran out with no node left unsearched, e.g. on the
+        # last node, stopped nothing
+        if self.finished and self.lower_bound == no_cost:
+            solution.stopped = None
+        # Dominance pruning may drop the only optimal path, so it proves
+        # no bound, and neither does a search that hasn't returned
+        if self.dominance or not self.finished:
+            solution.lower_bound = None
+        elif solution.stopped:
+            solution.lower_bound = min(self.lower_bound, self.cost_best)
+        else:
+            solution.lower_bound = solution.cost
+        return solution
+
+    def search_dfs(self, node, depth=0):
+        """Depth-first branch and bound that solves the board.
+
+        depth is the number of attacks made to reach the node.
+        Once a budget ran out, the nodes left are only visited to take
+        their cost + minimum_extra_cost into the lower bound.
+
+        The nodes still to visit are kept on an explicit stack of child
+        iterators, one per depth, instead of the Python call stack, so
+        the length of a solution isn't limited by the recursion limit.
+        The nodes are visited in the same order as by recursion.
+        """
+        # (depth, children left to visit) of every node on the path
+        stack = [(depth, iter((node,)))]
+        while stack:
+            depth, children = stack[-1]
+            node = next(children, None)
+            if node is None:
+                stack.pop()
+                continue
+            cost = node[2]
+
+            # print_history(node_path(node), self.cols)
             # raw_input('Continue')
 
-            print('Best cost:', cost_best)
-        return
-
-    # Optimization: Bail if minimum future cost already beaten
-    if cost + minimum_extra_cost(health_left) >= cost_best:
-        bails += 1
-        if bails % 10000 == 0:
-            print('bails:', bails)
-        # print_history(history)
-        # raw_input('Continue')
-        return
-
-    # Get valid floors that are reachable
-    loc = history[-1][3]
-    r = loc[0]
-    c = loc[1]
-    walked = [[r, c]]
-    valid_floors = [[r, c]]
-    get_valid_floors(history, walked, valid_floors)
-
-    # Complete all swords first; seems to work faster
-    for loc in valid_floors:
-        r = loc[0]
-        c = loc[1]
-        check_sword_attacks(history, r, c)
-
-    for loc in valid_floors:
-        r = loc[0]
-        c = loc[1]
-        check_spear_attacks(history, r, c)
-
-    for loc in valid_floors:
-        r = loc[0]
-        c = loc[1]
-        check_dagger_attacks(history, r, c)
-
-    for loc in valid_floors:
-        r = loc[0]
-        c = loc[1]
-        check_bow_attacks(history, r, c)
+            # Pick up better solutions found by the other workers
+            shared_cost = self.shared_cost
+            if shared_cost is not None and shared_cost.value < self.cost_best:
+                self.cost_best = shared_cost.value
+
+            health_left = node[5]
+            if not health_left:
+                if self.cost_best > cost:
+                    self.new_incumbent(node)
+
+                    # print_history(node_path(node), self.cols)
+                    # raw_input('Continue')
+
+                    if shared_cost is not None:
+                        with shared_cost.get_lock():
+                            if cost < shared_cost.value:
+                                shared_cost.value = cost
+
+                    self.report('Best cost:', self.cost_best)
+                continue
+
+            cost_min = cost + minimum_extra_cost(node)
+            if self.stopped:
+                self.lower_bound = min(self.lower_bound, cost_min)
+                continue
+
+            # Optimization: Bail if minimum future cost already beaten
+            if cost_min >= self.cost_best:
+                self.bails += 1
+                if self.ordering == 'history':
+                    attack = (node[1], node[3])
+                    self.history[attack] = self.history.get(attack, 0) - 1
+                    self.cutoff_depth = depth
+                if self.bails % 10000 == 0:
+                    self.report('bails:', self.bails)
+                # print_history(node_path(node), self.cols)
+                # raw_input('Continue')
+                continue
+            if self.dominance and self.is_dominated(
+                    node[0], self.knight_region(node[0], node[3]), node[6],
+                    cost):
+                self.dominated += 1
+                continue
+            # A killer passes the bound where its siblings were cut off
+            if self.cutoff_depth == depth and self.ordering == 'history':
+                self.killers[depth] = (node[1], node[3])
+
+            stack.append((depth + 1,
+                          iter(self.order(self.expand(node), depth + 1))))
+
+    def order(self, children, depth):
+        """Sorts the children at depth in the order search_dfs tries them.
+
+        A good solution found early lets the bound prune more, so the
+        orderings try the promising attacks first:
+            weapon: sword, spear, dagger, bow, as expand returns them.
+            efficiency: most health taken per cost unit first.
+            history: the killer attack of the depth first, then the
+                attacks most often on the path of a better solution and
+                least often cut off by the bound.
+        The sorts are stable, so ties keep the weapon order.
+        """
+        if self.ordering == 'efficiency':
+            children.sort(key=attack_efficiency, reverse=True)
+        elif self.ordering == 'history':
+            killer = self.killers.get(depth)
+            history = self.history
+            children.sort(key=lambda child: (
+                (child[1], child[3]) == killer,
+                history.get((child[1], child[3]), 0)), reverse=True)
+        return children
+
+    def new_incumbent(self, node):
+        """Keeps the finished node as the best solution found so far."""
+        self.cost_best = node[2]
+        self.node_best = node
+        self.incumbents.append((node[2], self.nodes_expanded,
+                                time.time() - self.time_start))
+        if self.on_incumbent is not None:
+            self.on_incumbent(self.solution())
+        # Remember its attacks for the 'history' ordering
+        for depth, step in enumerate(node_path(node)[1:], 1):
+            attack = (step[1], step[3])
+            self.history[attack] = self.history.get(attack, 0) + 1
+            self.killers[depth] = attack
+
+    def report(self, *values):
+        """Prints a line of search progress to stdout unless quiet."""
+        if not self.quiet:
+            print(*values)
+
+    def search_parallel(self, root, text, workers, split_depth=1):
+        """Depth-first branch and bound over a pool of worker processes.
+
+        The root is expanded split_depth plies here, and every node of
+        that frontier is solved by a worker with search_dfs. The workers
+        share the best cost found so far, so each of them prunes with the
+        global bound, and the best solution of all workers is kept.
+        text is the board text the workers load into their own Solver.
+        The solutions a worker finds only come back, and go to
+        on_incumbent, once its subtree is solved.
+        """
+        frontier = [root]
+        for _ in range(split_depth):
+            frontier = [child for node in frontier for child in
+                        (self.expand(node) if node[5] else [node])]
+
+        shared = multiprocessing.Value('i', self.cost_best)
+        with ProcessPoolExecutor(workers, initializer=init_worker,
+                                 initargs=(text, shared, self.symmetry,
+                                           self.ordering, self.table_mb,
+                                           self.backend, self.dominance,
+                                           self.quiet, self.deadline,
+                                           self.node_limit,
+                                           self.memory_limit,
+                                           self.floor_cache_mb)) as pool:
+            for cost, path, stats, stopped, lower_bound in pool.map(
+                    solve_subtree, frontier):
+                self.nodes_expanded += stats.nodes_expanded
+                self.worker_stats.add(stats)
+                self.stopped = self.stopped or stopped
+                self.lower_bound = min(self.lower_bound, lower_bound)
+                if path is not None and cost < self.cost_best:
+                    self.new_incumbent(link_path(path))
+
+    def search_astar(self, root):
+        """Best-first search that expands the lowest cost + minimum_extra_cost
+        node first. minimum_extra_cost never overestimates, so the first
+        finished board taken from the queue is optimal and the search stops.
+        Ties are broken towards the higher cost, i.e. the deeper node.
+        If a budget runs out, the lowest estimate left in the queue is
+        the lower bound.
+        """
+        counter = itertools.count()
+        queue = [(minimum_extra_cost(root), 0, next(counter), root)]
+        while queue:
+            if self.stopped:
+                self.lower_bound = queue[0][0]
+                return
+            _, _, _, node = heapq.heappop(queue)
+            cost = node[2]
+
+            # Skip queue entries whose state was reached cheaper since
+            region = self.knight_region(node[0], node[3])
+            key = self.state_key(node[0], region, node[6])
+            if self.transposition_table.get(key, cost) < cost:
+                continue
+
+            if not node[5]:
+                self.new_incumbent(node)
+                self.report('Best cost:', self.cost_best)
+                return
+            if self.dominance and \
+                    self.is_dominated(node[0], region, node[6], cost):
+                self.dominated += 1
+                continue
+
+            for child in self.expand(node):
+                estimate = child[2] + minimum_extra_cost(child)
+                heapq.heappush(queue,
+                               (estimate, -child[2], next(counter), child))
+
+    def expand(self, node):
+        """Returns the child nodes of every attack available to the knight,
+        see kernel.find_attacks."""
+        self.nodes_expanded += 1
+        # A node of a large board can take milliseconds, so the clock is
+        # read on every one; the memory only every memory_interval seconds
+        now = time.time()
+        if self.node_limit is not None and \
+                self.nodes_expanded >= self.node_limit:
+            self.stopped = 'nodes'
+        elif self.deadline is not None and now > self.deadline:
+            self.stopped = 'time'
+        elif self.memory_limit is not None and now >= self.memory_check:
+            self.memory_check = now + memory_interval
+            if current_memory() >= self.memory_limit:
+                self.stopped = 'memory'
+        state = node[0]
+        monster_cells = node[6]
+
+        # Get the labels of the floor regions and the knight's region
+        labels, label = self.get_floor_region(state, node[3])
+        if self.backend == 'numpy':
+            attacks = self.find_attacks_numpy(state, labels, label)
+        else:
+            attacks = find_attacks(state, monster_cells, labels, label,
+                                   self.attack_templates)
+
+        # Complete all swords first; seems to work faster
+        children = []
+        for loc, template in attacks:
+            self.do_attacks(node, loc, template, children)
+        return children
+
+    def find_attacks_numpy(self, state, labels, label):
+        """NumPy version of kernel.find_attacks.
+
+        Every template is checked on all cells of the knight's region at
+        once. Only the span of flat indices from the first to the last cell
+        of the region is looked at, and the monster and floor masks are
+        built once for that span widened by the longest template offset,
+        so the mask of the cells at any offset is a slice of them rather
+        than a copy. The hits of a template from every cell are the sum of
+        its offset monster masks, and its lone hits, blockers and the
+        region are mask operations, as in kernel.check_attack.
+        """
+        region = self.floor_cache[state][1][label - 1]
+        start, stop = region[0], region[-1] + 1
+        margin = self.template_reach
+        cells = numpy.frombuffer(state, dtype=numpy.uint8,
+                                 count=stop - start + 2 * margin,
+                                 offset=start - margin)
+        monster = ((cells > floor) & (cells < wall)).view(numpy.uint8)
+        not_floor = cells != floor
+        in_region = numpy.frombuffer(labels, dtype=numpy.uint16,
+                                     count=stop - start,
+                                     offset=2 * start) == label
+        size = stop - start
+
+        def at(mask, offset):
+            return mask[margin + offset:margin + offset + size]
+
+        attacks = []
+        for weapon_templates in self.attack_templates:
+            for template in weapon_templates:
+                _, _, targets, _, min_hits, blockers, lone_hits = template
+                if min_hits == len(targets) and not lone_hits:
+                    allowed = in_region.copy()
+                    for t in targets:
+                        allowed &= at(monster, t).view(bool)
+                else:
+                    hits = at(monster, targets[0]).copy()
+                    for t in targets[1:]:
+                        hits += at(monster, t)
+                    allowed = hits >= min_hits
+                    for t, b in lone_hits:
+                        allowed |= at(monster, t).view(bool) & at(not_floor, b)
+                    allowed &= in_region
+                for b in blockers:
+                    allowed &= at(not_floor, b)
+                attacks.extend((start + loc, template)
+                               for loc in numpy.flatnonzero(allowed).tolist())
+        return attacks
+
+    def get_floor_region(self, state, loc):
+        """Returns the region labels of the board and the label of loc.
+
+        labels[i] is the same non-zero number for all floor cells of one
+        walkable region found so far and 0 elsewhere.
+
+        Flood fill, see kernel.fill_region, or fill_region_numpy with the
+        numpy backend. Each board state gets one preallocated array of
+        region labels that serves as the visited array, so a region is
+        filled once and then reused by every later expansion of the same
+        board, wherever the knight stands inside it.
+        """
+        cached = self.floor_cache.get(state)
+        if cached is None:
+            if self.floor_cache_bytes >= self.floor_cache_mb * 2 ** 20:
+                self.floor_cache.clear()
+                self.floor_cache_bytes = 0
+            cached = (array('H', bytes(2 * len(state))), [])
+            self.floor_cache[state] = cached
+            self.floor_cache_bytes += \
+                sys.getsizeof(state) + sys.getsizeof(cached[0])
+        labels, regions = cached
+        if labels[loc]:
+            return labels, labels[loc]
+
+        time_start = time.perf_counter()
+        label = len(regions) + 1
+        if self.backend == 'numpy':
+            region = self.fill_region_numpy(state, loc, labels, label)
+        else:
+            region = sorted(fill_region(state, loc, self.steps))
+            for cell in region:
+                labels[cell] = label
+        region = array('I', region)
+        regions.append(region)
+        self.floor_cache_bytes += sys.getsizeof(region)
+        self.flood_fills += 1
+        self.flood_fill_time += time.perf_counter() - time_start
+        return labels, label
+
+    def fill_region_numpy(self, state, loc, labels, label):
+        """NumPy version of kernel.fill_region, returns the cells sorted.
+
+        The region grows from loc by one step in every direction at a time,
+        as a mask over the whole board, until it stops growing. The walls
+        around the board keep the steps of one flat index from wrapping
+        into the next row.
+        """
+        cols = self.cols
+        is_floor = numpy.frombuffer(state, dtype=numpy.uint8) == floor
+        reached = numpy.zeros(len(state), dtype=bool)
+        reached[loc] = True
+        count = 1
+        while True:
+            grown = reached.copy()
+            grown[cols:] |= reached[:-cols]
+            grown[:-cols] |= reached[cols:]
+            grown[1:] |= reached[:-1]
+            grown[:-1] |= reached[1:]
+            grown &= is_floor
+            grown_count = numpy.count_nonzero(grown)
+            if grown_count == count:
+                break
+            reached, count = grown, grown_count
+        numpy.frombuffer(labels, dtype=numpy.uint16)[reached] = label
+        return numpy.flatnonzero(reached).tolist()
+
+    def knight_region(self, state, loc):
+        """Returns the sorted cells of the floor region of loc.
+
+        The knight can walk anywhere in its region before the next attack,
+        so the region, identified by its first cell, stands for the knight's
+        position in the transposition table.
+        """
+        labels, label = self.get_floor_region(state, loc)
+        return self.floor_cache[state][1][label - 1]
+
+    def state_key(self, state, region, monster_cells):
+        """Returns the transposition table key of the knight in region, the
+        same for every mirror and rotation of the state on symmetric walls."""
+        if not self.symmetries:
+            return state, region[0]
+        # The healths packed 2 bits per cell, the smallest over the mirrors
+        cells = tuple(monster_cells)
+        health = tuple(map(state.__getitem__, cells))
+        return min([(sum(map(mul, health, map(weights.__getitem__, cells))),
+                     min(map(mirror.__getitem__, region)))
+                    for weights, mirror in self.symmetries])
+
+    def is_dominated(self, state, region, monster_cells, cost):
+        """Returns True if a state with no more health on the same monster
+        cells, or all but one, was reached in the region at no higher cost,
+        otherwise records the state; not exact, so off by default."""
+        # Keyed by the sum of the cell_keys of the monster cells: (cells,
+        # top bit of every health byte, sorted (cost, packed healths))
+        by_cells = self.dominance_table.get(region[0])
+        if by_cells is None:
+            by_cells = self.dominance_table[region[0]] = {}
+        cell_keys = self.cell_keys
+        cells = tuple(sorted(monster_cells))
+        health = bytes(map(state.__getitem__, cells))
+        key = sum(map(cell_keys.__getitem__, cells))
+        same = by_cells.get(key)
+        if same is not None and same[0] != monster_cells:
+            same = None
+        # The same monster cells, then all of them but the i-th
+        for i in range(-1, len(cells)):
+            if i < 0:
+                found, found_health = same, health
+            else:
+                found = by_cells.get(key - cell_keys[cells[i]])
+                if found is None or not found[0] <= monster_cells:
+                    continue
+                found_health = health[:i] + health[i + 1:]
+            if found is None:
+                continue
+            guard = found[1]
+            value = int.from_bytes(found_health, 'big') | guard
+            # A byte of other_health is no higher if subtracting it from
+            # the byte with its top bit set keeps the bit
+            for other_cost, other_health in found[2]:
+                if other_cost > cost:
+                    break
+                if value - other_health & guard == guard:
+                    return True
+
+        if same is None:
+            same = by_cells[key] = (monster_cells,
+                                    int.from_bytes(b'\x80' * len(cells),
+                                                   'big'), [])
+        value = int.from_bytes(health, 'big')
+        guard = same[1]
+        entries = same[2]
+        # Drop the states the new one dominates, which cost no less
+        start = bisect.bisect_left(entries, (cost,))
+        if any((entry[1] | guard) - value & guard == guard
+               for entry in entries[start:]):
+            entries[start:] = [entry for entry in entries[start:]
+                               if (entry[1] | guard) - value & guard != guard]
+        bisect.insort(entries, (cost, value))
+        return False
+
+    def do_attacks(self, node, loc, template, children):
+        """Executes the attack of the template from loc and adds the child,
+        see kernel.apply_attack."""
+        action, cost_add, targets, push = template[:4]
+        self.moves_generated[action] = self.moves_generated.get(action, 0) + 1
+        # (from, to) cells of every monster hit, to is -1 if it died
+        state, hits, moves = apply_attack(node[0], loc, targets, push)
+        cost = node[2] + cost_add
+        health_left = node[5] - hits
+
+        # Skip the move if the same board with the knight in the same region
+        # was already reached at the same or lower cost
+        transposition_table = self.transposition_table
+        region = self.knight_region(state, loc)
+        key = (state, region[0])
+        if transposition_table.get(key, cost + 1) <= cost:
+            self.duplicates += 1
+            return
+        transposition_table[key] = cost
+
+        monster_cells = set(node[6])
+        monster_cells.difference_update(m[0] for m in moves)
+        monster_cells.update(m[1] for m in moves if m[1] != -1)
+
+        # Or a mirror of it; the exact board is looked up first above,
+        # as building the symmetric key costs far more than a lookup
+        if self.symmetries:
+            key = self.state_key(state, region, monster_cells)
+            if transposition_table.get(key, cost + 1) <= cost:
+                self.duplicates += 1
+                return
+            transposition_table[key] = cost
+
+        children.append((state, action, cost, loc, node,
+                         health_left, frozenset(monster_cells)))
 
 
 # -------------------------------------------------------------------------------
-def get_valid_floors(history, walked, valid_floors):
-    state = history[-1][0]
-    loc = walked[-1]
-    r = loc[0]
-    c = loc[1]
-
-    # Try north
-    if state[r - 1][c] == floor and [r - 1, c] not in valid_floors:
-        walked_new = copy.deepcopy(walked)
-        walked_new.append([r - 1, c])
-        valid_floors.append([r - 1, c])
-        get_valid_floors(history, walked_new, valid_floors)
-
-    # Try east
-    if state[r][c + 1] == floor and [r, c + 1] not in valid_floors:
-        walked_new = copy.deepcopy(walked)
-        walked_new.append([r, c + 1])
-        valid_floors.append([r, c + 1])
-        get_valid_floors(history, walked_new, valid_floors)
-
-    # Try south
-    if state[r + 1][c] == floor and [r + 1, c] not in valid_floors:
-        walked_new = copy.deepcopy(walked)
-        walked_new.append([r + 1, c])
-        valid_floors.append([r + 1, c])
-        get_valid_floors(history, walked_new, valid_floors)
-
-    # Try west
-    if state[r][c - 1] == floor and [r, c - 1] not in valid_floors:
-        walked_new = copy.deepcopy(walked)
-        walked_new.append([r, c - 1])
-        valid_floors.append([r, c - 1])
-        get_valid_floors(history, walked_new, valid_floors)
+def solve_board(board_text, search='dfs', symmetry=False, ordering='weapon',
+                table_mb=None, backend='python', dominance=False, quiet=False,
+                floor_cache_mb=64, **options):
+    """Solves the board text with a new Solver and returns its Solution.
 
+    The options are passed on to Solver.solve_board.
+    """
+    solver = Solver(floor_cache_mb, symmetry=symmetry, ordering=ordering,
+                    table_mb=table_mb, backend=backend, dominance=dominance,
+                    quiet=quiet)
+    return solver.solve_board(board_text, search, **options)
 
-# ------------------------------------------------------------------------------
-def minimum_extra_cost(health_left):
-    """Extremely important optimization to reduce recursion massively."""
-    extra_cost = (health_left // 3) * 80
-    health_left %= 3
-    if health_left == 2:
-        extra_cost += 70
-    if health_left == 1:
-        extra_cost += 50
-    return extra_cost
+
+# -------------------------------------------------------------------------------
+def print_history(history, cols, out=None):
+    """Writes the board after every node of the history with the knight
+    as '*' to out, stdout by default, in one write."""
+    lines = ['']
+    for h in history:
+        lines.append('Action: {} / Cost: {}'.format(h[1], h[2]))
+        lines += render_board(h[0], h[3], cols)
+        lines.append('')
+    lines.append('------------------------------------------')
+    (out or sys.stdout).write('\n'.join(lines) + '\n')
 
 
 # -------------------------------------------------------------------------------
-def monster_health_remaining(history):
-    """Calculates the remaining health of monsters on the board."""
-    health_left = 0
-    state = history[-1][0]
-    for r in range(len(state)):
-        for c in range(len(state[0])):
-            if state[r][c] == monster_red:
-                health_left += 3
-            if state[r][c] == monster_purple:
-                health_left += 2
-            if state[r][c] == monster_blue:
-                health_left += 1
-    return health_left
+def solution_record(solution):
+    """Returns the Solution as a dict for JSON, with the moves as
+    [action, cost, row, col]."""
+    return {'cost': solution.cost,
+            'moves': [[action, cost, row, col]
+                      for action, cost, (row, col) in solution.moves()],
+            'nodes_expanded': solution.nodes_expanded,
+            'elapsed': round(solution.elapsed, 6),
+            'stopped': solution.stopped,
+            'lower_bound': solution.lower_bound}
 
 
 # -------------------------------------------------------------------------------
-def check_sword_attacks(history, r, c):
-    # Only swing if two or three monsters hit or if one diagonal
-    # without space for dagger swing
-    # and potential push (results in same effect for cheaper)
-    state = history[-1][0]
-    for direction in 'NESW':
-        attacks = []
-        do_attack = False
-        monster_count = 0
-
-        # Check north
-        if direction == 'N':
-            for c_offset in range(-1, 2):
-                if state[r - 1][c + c_offset] in monsters:
-                    monster_count += 1
-            if monster_count > 1:
-                do_attack = True
-            elif monster_count == 1:
-                if state[r - 1][c - 1] in monsters and \
-                        state[r][c - 1] != floor:
-                    do_attack = True
-                if state[r - 1][c + 1] in monsters and \
-                        state[r][c + 1] != floor:
-                    do_attack = True
-            if do_attack:
-                attacks = [[r - 1, c - 1], [r - 1, c], [r - 1, c + 1]]
-                push_dir_col = 0
-                push_dir_row = -1
-
-        # Check east
-        if direction == 'E':
-            for r_offset in range(-1, 2):
-                if state[r + r_offset][c + 1] in monsters:
-                    monster_count += 1
-            if monster_count > 1:
-                do_attack = True
-            elif monster_count == 1:
-                if state[r - 1][c + 1] in monsters and \
-                        state[r - 1][c] != floor:
-                    do_attack = True
-                if state[r + 1][c + 1] in monsters and \
-                        state[r + 1][c] != floor:
-                    do_attack = True
-            if do_attack:
-                attacks = [[r - 1, c + 1], [r, c + 1], [r + 1, c + 1]]
-                push_dir_col = 1
-                push_dir_row = 0
-
-        # Check south
-        if direction == 'S':
-            for c_offset in range(-1, 2):
-                if state[r + 1][c + c_offset] in monsters:
-                    monster_count += 1
-            if monster_count > 1:
-                do_attack = True
-            elif monster_count == 1:
-                if state[r + 1][c - 1] in monsters and \
-                        state[r][c - 1] != floor:
-                    do_attack = True
-                if state[r + 1][c + 1] in monsters and \
-                        state[r][c + 1] != floor:
-                    do_attack = True
-            if do_attack:
-                attacks = [[r + 1, c - 1], [r + 1, c], [r + 1, c + 1]]
-                push_dir_col = 0
-                push_dir_row = 1
-
-        # Check west
-        if direction == 'W':
-            for r_offset in range(-1, 2):
-                if state[r + r_offset][c - 1] in monsters:
-                    monster_count += 1
-            if monster_count > 1:
-                do_attack = True
-            elif monster_count == 1:
-                if state[r - 1][c - 1] in monsters and \
-                        state[r - 1][c] != floor:
-                    do_attack = True
-                if state[r + 1][c - 1] in monsters and \
-                        state[r + 1][c] != floor:
-                    do_attack = True
-            if do_attack:
-                attacks = [[r - 1, c - 1], [r, c - 1], [r + 1, c - 1]]
-                push_dir_col = -1
-                push_dir_row = 0
-
-        if len(attacks):
-            do_attacks(history, attacks, push_dir_row, push_dir_col,
-                       'Sword', 80, r, c)
+def write_boards(solution, out):
+    """Writes the board of every step of the solution, see print_history."""
+    print_history(solution.path, solution.cols, out)
 
 
 # -------------------------------------------------------------------------------
-def check_spear_attacks(history, r, c):
-    # There's no point in using a spear attack unless it's hitting 2 monsters.
-    # If only one next to knight, dagger is cheaper.
-    # If only one two away from knight, bow is cheaper.
-    state = history[-1][0]
-    for direction in 'NESW':
-        attacks = []
+def write_moves(solution, out):
+    """Writes one line per move: action, cost so far, row and column."""
+    out.write(''.join('{} {} {} {}\n'.format(action, cost, row, col)
+                      for action, cost, (row, col) in solution.moves()))
+
 
-        # Check north
-        if direction == 'N':
-            if state[r - 2][c] in monsters and \
-                    state[r - 1][c] in monsters:
-                attacks = [[r - 2, c], [r - 1, c]]
-                push_dir_col = 0
-                push_dir_row = -1
-
-        # Check east
-        if direction == 'E':
-            if state[r][c + 2] in monsters and \
-                    state[r][c + 1] in monsters:
-                attacks = [[r, c + 2], [r, c + 1]]
-                push_dir_col = 1
-                push_dir_row = 0
-
-        # Check south
-        if direction == 'S':
-            if state[r + 2][c] in monsters and \
-                    state[r + 1][c] in monsters:
-                attacks = [[r + 2, c], [r + 1, c]]
-                push_dir_col = 0
-                push_dir_row = 1
-
-        # Check west
-        if direction == 'W':
-            if state[r][c - 2] in monsters and \
-                    state[r][c - 1] in monsters:
-                attacks = [[r, c - 2], [r, c - 1]]
-                push_dir_col = -1
-                push_dir_row = 0
-
-        if len(attacks):
-            do_attacks(history, attacks, push_dir_row, push_dir_col,
-                       'Spear', 70, r, c)
+# -------------------------------------------------------------------------------
+def write_json(solution, out):
+    """Writes the solution_record of the solution as one JSON line."""
+    out.write(json.dumps(solution_record(solution)) + '\n')
+
+
+# Ways to write a solution out, see main
+traces = {'boards': write_boards, 'moves': write_moves, 'json': write_json}
 
 
 # -------------------------------------------------------------------------------
-def check_bow_attacks(history, r, c):
-    """Checks for valid bow attacks."""
-    state = history[-1][0]
-    for direction in 'NESW':
-        attacks = []
+def render_board(state, loc, cols):
+    """Returns the board rows as strings with the knight drawn as '*'."""
+    cells = bytearray(state.translate(symbol_table))
+    cells[loc] = ord('*')
+    text = cells.decode()
+    return [text[i:i + cols] for i in range(0, len(text), cols)]
 
-        # Check north
-        if direction == 'N':
-            if state[r - 2][c] in monsters and \
-                    state[r - 1][c] != floor:
-                attacks = [[r - 2, c]]
-                push_dir_col = 0
-                push_dir_row = -1
-
-        # Check east
-        if direction == 'E':
-            if state[r][c + 2] in monsters and \
-                    state[r][c + 1] != floor:
-                attacks = [[r, c + 2]]
-                push_dir_col = 1
-                push_dir_row = 0
-
-        # Check south
-        if direction == 'S':
-            if state[r + 2][c] in monsters and \
-                    state[r + 1][c] != floor:
-                attacks = [[r + 2, c]]
-                push_dir_col = 0
-                push_dir_row = 1
-
-        # Check west
-        if direction == 'W':
-            if state[r][c - 2] in monsters and \
-                    state[r][c - 1] != floor:
-                attacks = [[r, c - 2]]
-                push_dir_col = -1
-                push_dir_row = 0
-
-        if len(attacks):
-            do_attacks(history, attacks, push_dir_row, push_dir_col,
-                       'Bow', 60, r, c)
+
+# -------------------------------------------------------------------------------
+def parse_board(text, first_line=1):
+    """Checks the board text and converts it to the flat bytes state.
+
+    Returns the state, the flat index of the start cell,
+    which is -1 if there is no 'S' on the board, and the board width.
+    Blank lines around the board are skipped; first_line is the number
+    of the first line of the text in error messages.
+
+    Raises BoardError if the rows differ in length, a cell isn't one of
+    '.BPRWS', there is more than one 'S', or the board isn't surrounded
+    by the double wall that keeps the moves and attacks on the board.
+    """
+    rows = text.splitlines()
+    while rows and not rows[-1].strip():
+        rows.pop()
+    top = 0
+    while top < len(rows) and not rows[top].strip():
+        top += 1
+    first_line += top
+    rows = rows[top:]
+    if not rows:
+        raise BoardError('Empty board')
+    cols = len(rows[0])
+    for number, row in enumerate(rows):
+        if len(row) != cols:
+            if not row.strip():
+                raise BoardError('Blank line inside the board, boards of '
+                                 'a file are read with read_boards',
+                                 first_line + number)
+            raise BoardError('Row of {} cells, the first row has {}'
+                             .format(len(row), cols), first_line + number)
+
+    def error(message, index):
+        return BoardError(message, first_line + index // cols,
+                          index % cols + 1)
+
+    flat = ''.join(rows)
+    # 'replace' keeps one byte per character, so indices stay the same
+    data = flat.encode('ascii', 'replace')
+    if data.translate(None, board_symbols.encode()):
+        index = next(i for i, symbol in enumerate(flat)
+                     if symbol not in board_symbols)
+        raise error('Unknown symbol {!r}, cells are one of {}'
+                    .format(flat[index], board_symbols), index)
+    loc = flat.find(start)
+    if loc != -1 and flat.find(start, loc + 1) != -1:
+        raise error('Second start', flat.find(start, loc + 1))
+
+    inner = 2 * wall_width + 1
+    if len(rows) < inner or cols < inner:
+        raise BoardError('Board of {}x{} cells, the double wall needs at '
+                         'least {}x{}'.format(len(rows), cols, inner, inner))
+    for number, row in enumerate(rows):
+        if wall_width <= number < len(rows) - wall_width:
+            spans = ((0, wall_width), (cols - wall_width, cols))
+        else:
+            spans = ((0, cols),)
+        for begin, end in spans:
+            if row.count('W', begin, end) != end - begin:
+                column = next(c for c in range(begin, end) if row[c] != 'W')
+                raise error('Missing double wall', number * cols + column)
+
+    state = data.translate(cell_table)
+    return state, loc, cols
 
 
 # -------------------------------------------------------------------------------
-def check_dagger_attacks(history, r, c):
-    """Checks for valid dagger attacks."""
-    state = history[-1][0]
-    for direction in 'NESW':
-        attacks = []
+def read_boards(text):
+    """Yields (line number, board text, parse_board result) of every
+    board of a text with boards separated by blank lines.
+
+    Every board is checked with parse_board when it's read, so a
+    malformed board raises BoardError with its line in the whole text,
+    and the result is passed on to Solver.load to not parse it again.
+    """
+    lines = text.splitlines()
+    first = None
+    for number, line in enumerate(lines + [''], 1):
+        if not line.strip():
+            if first is not None:
+                board = '\n'.join(lines[first - 1:number - 1]) + '\n'
+                yield first, board, parse_board(board, first)
+                first = None
+        elif first is None:
+            first = number
 
-        # Check north
-        if direction == 'N':
-            if state[r - 1][c] in monsters:
-                attacks = [[r - 1, c]]
-                push_dir_col = 0
-                push_dir_row = -1
-
-        # Check east
-        if direction == 'E':
-            if state[r][c + 1] in monsters:
-                attacks = [[r, c + 1]]
-                push_dir_col = 1
-                push_dir_row = 0
-
-        # Check south
-        if direction == 'S':
-            if state[r + 1][c] in monsters:
-                attacks = [[r + 1, c]]
-                push_dir_col = 0
-                push_dir_row = 1
-
-        # Check west
-        if direction == 'W':
-            if state[r][c - 1] in monsters:
-                attacks = [[r, c - 1]]
-                push_dir_col = -1
-                push_dir_row = 0
-
-        if len(attacks):
-            do_attacks(history, attacks, push_dir_row, push_dir_col,
-                       'Dagger', 50, r, c)
+
+# ------------------------------------------------------------------------------
+def minimum_extra_cost(node):
+    """Extremely important optimization to reduce recursion massively.
+
+    Lower bound of the cost to finish the node, see health_cost.
+    """
+    state = node[0]
+    counts = [0, 0, 0, 0]
+    for m in node[6]:
+        counts[state[m]] += 1
+    return health_cost(counts[monster_blue], counts[monster_purple],
+                       counts[monster_red])
+
+
+# ------------------------------------------------------------------------------
+@lru_cache(maxsize=None)
+def health_cost(blue, purple, red):
+    """Returns the lowest cost to kill monsters with the given counts if
+    every attack could hit any 1, 2 or 3 different monsters once."""
+    total = blue + 2 * purple + 3 * red
+    if not total:
+        return 0
+    # The two largest healths, 0 if there are fewer monsters
+    h1, h2 = ([3] * min(red, 2) + [2] * min(purple, 2) + [1] * min(blue, 2) +
+              [0, 0])[:2]
+    cost_min = None
+    # By Gale-Ryser the attacks fit the monsters if the two largest do
+    for swords in range(min(total - h1 - h2, (total - h1) // 2,
+                            total // 3) + 1):
+        # As many spears as fit, daggers for the rest of the health
+        spears = min(total - h1 - 2 * swords, (total - 3 * swords) // 2)
+        daggers = total - 3 * swords - 2 * spears
+        cost = 80 * swords + 70 * spears + 50 * daggers
+        if cost_min is None or cost < cost_min:
+            cost_min = cost
+    return cost_min
 
 
 # -------------------------------------------------------------------------------
-def do_attacks(history, attacks, push_dir_row,
-               push_dir_col, action, cost_add, r, c):
-    """Executes the attack based on the action and updates the history."""
-    global history_complete
-
-    history = copy.deepcopy(history)
-    state = copy.deepcopy(history[-1][0])
-    cost = history[-1][2]
-    for a in attacks:
-        if state[a[0]][a[1]] in monsters:
-            mon = hit_monster(state[a[0]][a[1]])
-            if state[a[0] + push_dir_row][a[1] + push_dir_col] == floor:
-                state[a[0] + push_dir_row][a[1] + push_dir_col] = mon
-                state[a[0]][a[1]] = floor
-            else:
-                state[a[0]][a[1]] = mon
-    action += ' ' + do_text_direction(push_dir_row, push_dir_col)
-    cost += cost_add
+def peak_memory():
+    """Returns the peak resident memory of the process in MB, 0 if unknown.
+
+    The peak is over the whole life of the process, see current_memory.
     """
-    do_append = True
-    for item in history_complete:
-        if item[0] == state and item[1] < cost:
-            do_append = False
-            break
+    if resource is None:
+        return 0
+    # ru_maxrss is in bytes on macOS and in KB elsewhere
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 2 ** 20 if sys.platform == 'darwin' else maxrss / 1024
 
-    if do_append:
-        history_complete.append([state, cost])
-        history.append([state, action, cost, [r, c]])
 
-        solve(history)
+# -------------------------------------------------------------------------------
+def current_memory():
+    """Returns the resident memory of the process in MB now.
+
+    Unlike peak_memory it goes down again when memory is freed, so an
+    earlier board of a reused Solver or worker doesn't count against
+    the next one. Without /proc, i.e. off Linux, it is peak_memory.
     """
-    # This is way faster than the above even though it is recording
-    # more data than necessary
-    if [state, cost] not in history_complete:
-        history_complete.append([state, cost])
-        history.append([state, action, cost, [r, c]])
-        solve(history)
+    try:
+        with open('/proc/self/statm') as f:
+            resident = int(f.read().split()[1])
+    except OSError:
+        return peak_memory()
+    return resident * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+# -------------------------------------------------------------------------------
+def attack_efficiency(node):
+    """Returns the health the attack to the node took per cost unit."""
+    parent = node[4]
+    return (parent[5] - node[5]) / (node[2] - parent[2])
 
 
 # -------------------------------------------------------------------------------
-def do_text_direction(push_dir_row, push_dir_col):
-    """Returns the direction as a string based on row and column offsets."""
-    if push_dir_row == -1:
-        return 'North'
-    if push_dir_row == 1:
-        return 'South'
-    if push_dir_col == -1:
-        return 'West'
-    if push_dir_col == 1:
-        return 'East'
+def start_node(state, loc):
+    """Returns the root node, scanning the board for monsters once.
+
+    Every other node gets its health and monster cells
+    from its parent in Solver.do_attacks.
+    """
+    monster_cells = frozenset(i for i, cell in enumerate(state)
+                              if floor < cell < wall)
+    health_left = sum(state[i] for i in monster_cells)
+    return state, 'Start', 0, loc, None, health_left, monster_cells
 
 
 # -------------------------------------------------------------------------------
-def hit_monster(mon):
-    """Returns the next rank of the monster after being hit."""
-    mon_ranks = [monster_red, monster_purple, monster_blue, floor]
-    return mon_ranks[mon_ranks.index(mon) + 1]
+@lru_cache(maxsize=None)
+def build_attack_templates(cols):
+    """Builds the attack templates of every weapon for a board width.
+
+    Returns a tuple with one tuple of templates per weapon, in table order.
+    Each template is the weapons table entry rotated to one direction,
+    with every offset turned into a flat index offset:
+        (action, cost, targets, push, min_hits, blockers, lone_hits)
+    """
+    templates = []
+    for name, cost, targets, min_hits, blockers, lone_hits in weapons:
+        weapon_templates = []
+        for direction, rotate in directions:
+            def flat(offset):
+                r, c = rotate(*offset)
+                return r * cols + c
+
+            weapon_templates.append((
+                name + ' ' + direction,
+                cost,
+                tuple(flat(t) for t in targets),
+                flat((-1, 0)),
+                min_hits,
+                tuple(flat(b) for b in blockers),
+                tuple((flat(t), flat(b)) for t, b in lone_hits)))
+        templates.append(tuple(weapon_templates))
+    return tuple(templates)
 
 
 # -------------------------------------------------------------------------------
-# Main
+@lru_cache(maxsize=None)
+def build_cell_keys(size):
+    """Returns a random 64-bit number for every cell of a board of size
+    cells, the same for every board of that size."""
+    rng = random.Random(size)
+    return tuple(rng.getrandbits(64) for _ in range(size))
+
+
 # -------------------------------------------------------------------------------
-time_start = time.time()
-
-monsters = 'RPB'
-wall = 'W'
-floor = '.'
-monster_blue = 'B'
-monster_purple = 'P'
-monster_red = 'R'
-start = 'S'
+def board_symmetries(state, cols):
+    """Returns the mirrors and rotations of the board that keep its walls.
+
+    Each one is a tuple of flat indices, the cell loc moves to mirror[loc].
+    The identity is left out, and the rotations by 90 degrees and the
+    diagonal mirrors are only tried on square boards.
+    """
+    rows = len(state) // cols
+    last_r = rows - 1
+    last_c = cols - 1
+    # Cell (r, c) of the mirrored board is taken from cell transform(r, c)
+    transforms = [
+        lambda r, c: (r, last_c - c),
+        lambda r, c: (last_r - r, c),
+        lambda r, c: (last_r - r, last_c - c),
+    ]
+    if rows == cols:
+        transforms += [
+            lambda r, c: (c, r),
+            lambda r, c: (last_c - c, last_r - r),
+            lambda r, c: (c, last_r - r),
+            lambda r, c: (last_c - c, r),
+        ]
+
+    symmetries = []
+    for transform in transforms:
+        perm = []
+        for i in range(len(state)):
+            r, c = transform(*divmod(i, cols))
+            perm.append(r * cols + c)
+        if all((state[i] == wall) == (state[j] == wall)
+               for i, j in enumerate(perm)):
+            mirror = [0] * len(perm)
+            for i, j in enumerate(perm):
+                mirror[j] = i
+            symmetries.append(tuple(mirror))
+    return tuple(symmetries)
+
 
-# Optimization:
-# history_complete is used to ignore duplicate state and cost situations,
-# which is common in recursive bow and dagger attacks;
-# only includes state[0] and cost[1]
-history_complete = []
-
-history_best = []
-cost_best = 9999
-bails = 0
-
-if len(sys.argv) > 1:
-    filename = sys.argv[1][1:]
-else:
-    filename = 'test.txt'
-    print('You can use \'python solver.py -[filename]\'')
-print('Reading filename: ', filename)
-with open(filename) as f:
-    state = f.read().split('\n')
-
-# Convert strings to lists
-for i in range(len(state)):
-    state[i] = list(state[i])
-
-# Find the start
-loc_start = [-1, -1]
-for r in range(len(state)):
-    for c in range(len(state[0])):
-        if state[r][c] == start:
-            loc_start[0], loc_start[1] = r, c
-            state[r][c] = floor
-if loc_start[0] == -1:
-    print('No start found (\'S\' on board)')
-    exit()
-
-solve([[state, 'Start', 0, loc_start]])
-
-# Output best option found
-print('------------------------------------------')
-print('------------------------------------------')
-print('------------------------------------------')
-print('')
-print('Best Cost:', cost_best)
-print_history(history_best)
-
-print('Time elapsed:', time.time() - time_start)
-input('Continue')
+# -------------------------------------------------------------------------------
+def node_path(node):
+    """Returns the nodes from the start to the given node."""
+    path = []
+    while node is not None:
+        path.append(node)
+        node = node[4]
+    path.reverse()
+    return path
+
+
+# -------------------------------------------------------------------------------
+def unlink_path(node):
+    """Returns the nodes from the start to the given node without their
+    parents, see link_path.
+
+    Pickling a node pickles its parents one nested level each, which
+    overflows the Python stack on a long path, while a list of nodes
+    without parents pickles flat.
+    """
+    return [step[:4] + (None,) + step[5:] for step in node_path(node)]
+
+
+# -------------------------------------------------------------------------------
+def link_path(path):
+    """Returns the last node of an unlink_path list, with every node
+    linked to the one before it again."""
+    node = None
+    for step in path:
+        node = step[:4] + (node,) + step[5:]
+    return node
+
+
+# -------------------------------------------------------------------------------
+def init_worker(text, shared, symmetry=False, ordering='weapon',
+                table_mb=None, backend='python', dominance=False,
+                quiet=False, deadline=None, node_limit=None,
+                memory_limit=None, floor_cache_mb=64):
+    """Sets up the Solver of a worker process of Solver.search_parallel."""
+    global worker_solver
+
+    worker_solver = Solver(floor_cache_mb, symmetry=symmetry,
+                           ordering=ordering, table_mb=table_mb,
+                           backend=backend, dominance=dominance, quiet=quiet)
+    worker_solver.load(text)
+    worker_solver.shared_cost = shared
+    worker_solver.deadline = deadline
+    worker_solver.node_limit = node_limit
+    worker_solver.memory_limit = memory_limit
+
+
+# -------------------------------------------------------------------------------
+def solve_subtree(node):
+    """Solves one frontier node in a worker of Solver.search_parallel.
+
+    Returns the best cost, the path to the best node as unlink_path
+    gives it, or None if the subtree has nothing better than the shared
+    best cost, the Stats of the subtree, the budget that stopped the
+    worker if any and its lower bound.
+    """
+    solver = worker_solver
+    solver.cost_best = solver.shared_cost.value
+    solver.node_best = None
+    # The node count goes on, as the node limit holds for the worker
+    expanded = solver.nodes_expanded
+    solver.reset_stats()
+    solver.search_dfs(node, len(node_path(node)) - 1)
+    stats = solver.stats()
+    stats.nodes_expanded -= expanded
+    path = None if solver.node_best is None else unlink_path(solver.node_best)
+    return solver.cost_best, path, stats, solver.stopped, solver.lower_bound
+
+
+# -------------------------------------------------------------------------------
+# Main
+# -------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='Solves a knight and '
+                                                 'monsters board at the '
+                                                 'lowest cost.')
+    parser.add_argument('filename', nargs='?', default='test.txt',
+                        help='board file, test.txt by default')
+    parser.add_argument('--search', choices=('dfs', 'astar'), default='dfs',
+                        help='depth-first branch and bound (default) '
+                             'or best-first A* search')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='worker processes for the depth-first search, '
+                             '1 (default) solves in this process')
+    parser.add_argument('--split-depth', type=int, choices=(1, 2), default=1,
+                        help='plies expanded before handing the nodes '
+                             'to the workers, 1 by default')
+    parser.add_argument('--time-limit', type=float,
+                        help='seconds after which the best solution found '
+                             'so far is printed, no limit by default; '
+                             'astar finds none before it finished')
+    parser.add_argument('--node-limit', type=int,
+                        help='nodes expanded after which the best solution '
+                             'found so far is printed, no limit by default; '
+                             'astar finds none before it finished')
+    parser.add_argument('--memory-limit', type=float,
+                        help='MB of memory after which the best solution '
+                             'found so far is printed, no limit by default')
+    parser.add_argument('--ordering', choices=orderings, default='weapon',
+                        help='order the depth-first search tries the '
+                             'attacks in, weapon by default')
+    parser.add_argument('--symmetry', action='store_true',
+                        help='search mirrored and rotated states once on '
+                             'boards with symmetric walls')
+    parser.add_argument('--backend', choices=backends, default='python',
+                        help='find the attacks from the monsters (python, '
+                             'default) or on all cells at once with NumPy')
+    parser.add_argument('--dominance', action='store_true',
+                        help='drop states no better than one reached '
+                             'before; fewer nodes, but not proven optimal')
+    parser.add_argument('--stats',
+                        help='JSON file to write the search stats to, '
+                             '- for stdout')
+    parser.add_argument('--profile',
+                        help='run the search under cProfile and write the '
+                             'profile to this file, see pstats')
+    parser.add_argument('--cache',
+                        help='SQLite file of solved boards to look the board '
+                             'up in first and to store its solution in')
+    parser.add_argument('--trace', choices=sorted(traces) + ['none'],
+                        default='boards',
+                        help='write the solution as the board of every step '
+                             '(boards, default), one line per move (moves), '
+                             'a JSON line (json) or not at all (none)')
+    parser.add_argument('--output', default='-',
+                        help='file to write the solution to, stdout by '
+                             'default')
+    parser.add_argument('--quiet', action='store_true',
+                        help='only write the solution: no search progress, '
+                             'summary or prompt')
+    parser.add_argument('--table-mb', type=float,
+                        help='MB of the duplicate state table, which then '
+                             'replaces old states once full; grows without '
+                             'limit by default')
+    parser.add_argument('--floor-cache-mb', type=float, default=64,
+                        help='MB of the cache of floor regions per board '
+                             'state, which is then cleared; 64 by default')
+    args = parser.parse_args()
+    if args.workers > 1 and args.search != 'dfs':
+        parser.error('--workers needs --search dfs')
+
+    if not args.quiet:
+        print('Reading filename: ', args.filename)
+    with open(args.filename) as f:
+        text = f.read()
+
+    profile = cProfile.Profile() if args.profile else None
+    if profile is not None:
+        profile.enable()
+    options = {'search': args.search, 'symmetry': args.symmetry,
+               'ordering': args.ordering, 'table_mb': args.table_mb,
+               'backend': args.backend, 'dominance': args.dominance,
+               'quiet': args.quiet, 'workers': args.workers,
+               'split_depth': args.split_depth,
+               'time_limit': args.time_limit, 'node_limit': args.node_limit,
+               'memory_limit': args.memory_limit,
+               'floor_cache_mb': args.floor_cache_mb}
+    try:
+        if args.cache:
+            # cache.py imports this module, so only when it's used
+            from cache import SolutionCache, solve_cached
+
+            cache = SolutionCache(args.cache)
+            solution = solve_cached(cache, text, **options)
+            cache.close()
+        else:
+            solution = solve_board(text, **options)
+    except (BoardError, ImportError) as e:
+        sys.exit(str(e))
+    if profile is not None:
+        profile.disable()
+        profile.dump_stats(args.profile)
+
+    # Output best option found
+    if not args.quiet:
+        print('------------------------------------------')
+        print('------------------------------------------')
+        print('------------------------------------------')
+        print('')
+        print('Best Cost:', solution.cost)
+        if solution.cached:
+            print('Read from the cache')
+        if solution.stopped and solution.lower_bound is not None:
+            print('Stopped at the {} limit, the optimal cost is at least {}'
+                  .format(solution.stopped, solution.lower_bound))
+        elif solution.stopped:
+            print('Stopped at the {} limit'.format(solution.stopped))
+        print('Nodes expanded:', solution.nodes_expanded)
+        if solution.incumbents:
+            cost, nodes_expanded, elapsed = solution.incumbents[0]
+            print('First solution: cost {} after {} nodes and {:.3f}s, '
+                  '{} better ones since'.format(cost, nodes_expanded, elapsed,
+                                                len(solution.incumbents) - 1))
+    if args.trace != 'none':
+        if args.output == '-':
+            traces[args.trace](solution, sys.stdout)
+        else:
+            with open(args.output, 'w', buffering=2 ** 16) as out:
+                traces[args.trace](solution, out)
+
+    if not args.quiet:
+        print('Time elapsed:', solution.elapsed)
+        print('Nodes per second:', round(solution.stats.nodes_per_second()))
+    if args.stats == '-':
+        print(solution.stats.to_json())
+    elif args.stats:
+        with open(args.stats, 'w') as f:
+            f.write(solution.stats.to_json())
+    if not args.quiet:
+        input('Continue')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,718 @@
+import inspect
+import io
+import itertools
+import json
+import os
+import sys
+import tracemalloc
+import pytest
+from functools import lru_cache
+from unittest.mock import patch
+import main
+import puzzles
+
+
+SAMPLE_BOARD = '''WWWWWWWWWWWW
+WWWWWWWWWWWW
+WW........WW
+WW........WW
+WW........WW
+WW.WR..PW.WW
+WW...W.W..WW
+WW........WW
+WW...S....WW
+WW........WW
+WWWWWWWWWWWW
+WWWWWWWWWWWW
+'''
+
+# Five monsters, takes the DFS over 30000 nodes
+LARGE_BOARD = '''WWWWWWWWWWWW
+WWWWWWWWWWWW
+WW........WW
+WW.P..B...WW
+WW....W...WW
+WW.WR..PW.WW
+WW...W.W..WW
+WW.B......WW
+WW...S....WW
+WW........WW
+WWWWWWWWWWWW
+WWWWWWWWWWWW
+'''
+
+# Walls and monsters mirror left to right, only the start breaks it
+SYMMETRIC_BOARD = '''WWWWWWWWWW
+WWWWWWWWWW
+WW......WW
+WW.B..B.WW
+WW..PP..WW
+WW.W..W.WW
+WW.B.SB.WW
+WWWWWWWWWW
+WWWWWWWWWW
+'''
+
+SMALL_BOARDS = [
+    pytest.param('''WWWWWWWWWW
+WWWWWWWWWW
+WW......WW
+WW.R..P.WW
+WW..W...WW
+WW.B..S.WW
+WW......WW
+WWWWWWWWWW
+WWWWWWWWWW
+''', 240, id='open'),
+    pytest.param('''WWWWWWWWWW
+WWWWWWWWWW
+WW..S...WW
+WW.W.PP.WW
+WW...B..WW
+WW.R..W.WW
+WW......WW
+WWWWWWWWWW
+WWWWWWWWWW
+''', 280, id='walls'),
+    pytest.param('''WWWWWWWWW
+WWWWWWWWW
+WWS.R..WW
+WW.W.W.WW
+WW..B.PWW
+WWWWWWWWW
+WWWWWWWWW
+''', 300, id='corridor'),
+]
+
+
+def board_text(node, cols):
+    """Returns the board text of a node with the knight as the start."""
+    rows = main.render_board(node[0], node[3], cols)
+    return '\n'.join(rows).replace('*', 'S')
+
+
+def solve_exhaustive(text):
+    """Solves the board with A* and a zero bound, i.e. uniform cost search."""
+    solver = main.Solver()
+    root = solver.load(text)
+    with patch('main.minimum_extra_cost', return_value=0):
+        solver.search_astar(root)
+    return solver.cost_best, solver.node_best
+
+
+@pytest.mark.parametrize('search', ['search_dfs', 'search_astar'])
+def test_solve_sample_board(search):
+    """Test both search modes on the sample board from the docstring."""
+    solver = main.Solver()
+    getattr(solver, search)(solver.load(SAMPLE_BOARD))
+    assert solver.cost_best == 220
+    path = main.node_path(solver.node_best)
+    assert path[0][1] == 'Start'
+    assert path[-1][5] == 0
+    assert [node[2] for node in path] == sorted(node[2] for node in path)
+
+
+@pytest.mark.parametrize('text, cost', SMALL_BOARDS)
+@pytest.mark.parametrize('search', ['search_dfs', 'search_astar'])
+def test_solve_small_boards(text, cost, search):
+    """Test both search modes against the uniform cost search result."""
+    assert solve_exhaustive(text)[0] == cost
+    solver = main.Solver()
+    getattr(solver, search)(solver.load(text))
+    assert solver.cost_best == cost
+
+
+@pytest.mark.parametrize('text, cost', SMALL_BOARDS)
+def test_bound_never_overestimates(text, cost):
+    """Test the bound along the optimal path and on every child of the root
+    against the exact remaining cost found without any bound."""
+    cost_best, node_best = solve_exhaustive(text)
+    for node in main.node_path(node_best):
+        assert main.minimum_extra_cost(node) <= cost_best - node[2]
+
+    solver = main.Solver()
+    root = solver.load(text)
+    children = [(board_text(child, solver.cols),
+                 main.minimum_extra_cost(child))
+                for child in solver.expand(root)]
+    assert children
+    for child_text, extra_cost in children:
+        assert extra_cost <= solve_exhaustive(child_text)[0]
+
+
+def test_bound_at_least_total_health_bound():
+    """Test the bound is never looser than the one on the total health."""
+    for blue in range(5):
+        for purple in range(5):
+            for red in range(5):
+                health_left = blue + 2 * purple + 3 * red
+                extra_cost = (health_left // 3) * 80 + \
+                    (0, 50, 70)[health_left % 3]
+                assert main.health_cost(blue, purple, red) >= extra_cost
+
+
+@pytest.mark.parametrize(
+    'blue, purple, red, cost',
+    [(0, 0, 0, 0), (1, 0, 0, 50), (0, 0, 1, 150), (2, 0, 0, 70),
+     (0, 0, 3, 240), (1, 0, 1, 170)],
+)
+def test_health_cost(blue, purple, red, cost):
+    """Test the bound on hand-checked monster counts."""
+    assert main.health_cost(blue, purple, red) == cost
+
+
+@pytest.mark.parametrize('split_depth', [1, 2])
+@pytest.mark.parametrize('text, cost', SMALL_BOARDS)
+def test_solve_parallel(text, cost, split_depth):
+    """Test the process pool finds the same optimal cost as the serial DFS."""
+    solver = main.Solver()
+    solver.search_parallel(solver.load(text), text, 2, split_depth)
+    assert solver.cost_best == cost
+    assert solver.node_best[5] == 0
+    assert main.node_path(solver.node_best)[-1][2] == cost
+
+
+@pytest.mark.parametrize('search', ['dfs', 'astar'])
+def test_solve_board(search):
+    """Test the library entry point returns the solution and its moves."""
+    solution = main.solve_board(SAMPLE_BOARD, search)
+    assert solution.cost == 220
+    assert solution.nodes_expanded > 0
+    moves = solution.moves()
+    assert len(moves) == len(solution.path) - 1
+    assert moves[-1][1] == 220
+    for action, cost, (row, col) in moves:
+        assert action.split()[0] in ('Sword', 'Spear', 'Dagger', 'Bow')
+        assert 2 <= row < 10 and 2 <= col < 10
+
+
+def test_solver_reused_across_boards():
+    """Test one Solver gives the same results as a new one per board."""
+    solver = main.Solver()
+    for text, cost in [(SAMPLE_BOARD, 220)] + \
+            [param.values for param in SMALL_BOARDS]:
+        assert solver.solve_board(text).cost == cost
+
+
+def test_solve_board_without_start():
+    """Test a board without a start is rejected."""
+    with pytest.raises(ValueError, match='No start'):
+        main.solve_board(SAMPLE_BOARD.replace('S', '.'))
+
+
+@pytest.mark.parametrize('text', [
+    SAMPLE_BOARD.replace('\n', '\r\n'),
+    '\n\n' + SAMPLE_BOARD + '\n  \n',
+    SAMPLE_BOARD.rstrip('\n'),
+])
+def test_parse_board_layout(text):
+    """Test line endings and blank lines around the board don't matter."""
+    assert main.parse_board(text) == main.parse_board(SAMPLE_BOARD)
+
+
+@pytest.mark.parametrize('text, message, line, column', [
+    (SAMPLE_BOARD.replace('WR..PW', 'WR..XW'), 'Unknown symbol', 6, 8),
+    (SAMPLE_BOARD.replace('WW.WR', 'WWSWR'), 'Second start', 9, 6),
+    (SAMPLE_BOARD.replace('WW........WW', 'W.........WW', 1),
+     'double wall', 3, 2),
+    (SAMPLE_BOARD.replace('WW.WR..PW.WW', 'WW.WR..PW..W'),
+     'double wall', 6, 11),
+    (SAMPLE_BOARD[:-2] + '.\n', 'double wall', 12, 12),
+    (SAMPLE_BOARD.replace('WW...S....WW', 'WW...S.....WW'), 'Row of 13', 9,
+     None),
+    (SAMPLE_BOARD.replace('S....WW\n', 'S....WW\n\n'), 'Blank line', 10,
+     None),
+    ('WWWW\nWWSW\nWWWW\n', 'double wall needs', None, None),
+    ('\n\n', 'Empty', None, None),
+])
+def test_parse_board_errors(text, message, line, column):
+    """Test malformed boards fail with the line and column of the error."""
+    with pytest.raises(main.BoardError, match=message) as error:
+        main.parse_board(text)
+    assert (error.value.line, error.value.column) == (line, column)
+    with pytest.raises(ValueError, match=message):
+        main.solve_board(text)
+
+
+def test_main_board_error(tmp_path):
+    """Test a malformed board ends the program with its error, which
+    gives a non-zero exit status."""
+    path = tmp_path / 'board.txt'
+    path.write_text(SAMPLE_BOARD.replace('S', 'X'))
+    with patch('sys.argv', ['main.py', str(path), '--quiet']):
+        with pytest.raises(SystemExit) as exit_info:
+            main.main()
+    assert exit_info.value.code == 'Line 9, column 6: Unknown symbol ' \
+        "'X', cells are one of " + main.board_symbols
+
+
+def test_read_boards():
+    """Test the boards of a text are read with their first line."""
+    small = SMALL_BOARDS[0].values[0]
+    text = SAMPLE_BOARD + '\n' + small + '\n\n\n' + SAMPLE_BOARD
+    boards = list(main.read_boards(text))
+    assert [board[:2] for board in boards] == \
+        [(1, SAMPLE_BOARD), (14, small), (26, SAMPLE_BOARD)]
+    assert boards[2][2] == main.parse_board(SAMPLE_BOARD)
+
+
+def test_read_boards_error():
+    """Test a malformed board stops the boards at its line in the text."""
+    text = SAMPLE_BOARD + '\n' + SAMPLE_BOARD.replace('S', 'X')
+    boards = main.read_boards(text)
+    assert next(boards)[:2] == (1, SAMPLE_BOARD)
+    with pytest.raises(main.BoardError, match='Line 22, column 6'):
+        next(boards)
+
+
+@pytest.mark.parametrize('search', ['dfs', 'astar'])
+def test_solve_board_time_limit(search):
+    """Test the search stops at the time limit and reports it."""
+    solution = main.solve_board(LARGE_BOARD, search, time_limit=0)
+    assert solution.stopped == 'time'
+    assert solution.nodes_expanded == 1
+    if solution.cost is not None:
+        assert solution.moves()[-1][1] == solution.cost
+    assert solution.lower_bound <= 390
+
+
+def test_solve_board_time_limit_large():
+    """Test the time limit holds on a board whose nodes take milliseconds
+    to expand."""
+    text = puzzles.generate_board(1, rows=60, cols=60, monsters=10)
+    solution = main.solve_board(text, time_limit=0.2, quiet=True)
+    assert solution.stopped == 'time'
+    assert solution.elapsed < 0.5
+
+
+@pytest.mark.parametrize('text, count', [
+    (SAMPLE_BOARD, 0),
+    (SYMMETRIC_BOARD, 1),
+    (SAMPLE_BOARD.replace('WR..PW', 'R...P.').replace('W.W', '...'), 7),
+])
+def test_board_symmetries(text, count):
+    """Test the mirrors and rotations are only kept if the walls allow it,
+    the 90 degree ones only on square boards."""
+    state, _, cols = main.parse_board(text)
+    symmetries = main.board_symmetries(state, cols)
+    assert len(symmetries) == count
+    for mirror in symmetries:
+        assert sorted(mirror) == list(range(len(state)))
+        assert all(state[mirror[i]] == wall for i, wall in enumerate(state)
+                   if wall == main.wall)
+
+
+def test_is_dominated():
+    """Test a state is dominated by one with no more health on the same
+    cells, or on all of them but one, reached at the same or lower cost,
+    and only then."""
+    solver = main.Solver(dominance=True)
+    root = solver.load(SAMPLE_BOARD)
+    state, region, monster_cells = root[0], (root[3],), root[6]
+    red, purple = sorted(monster_cells)
+    weaker = bytearray(state)
+    weaker[red] -= 1
+    weaker = bytes(weaker)
+    mixed = bytearray(weaker)
+    mixed[purple] += 1
+    mixed = bytes(mixed)
+    assert not solver.is_dominated(state, region, monster_cells, 100)
+    assert solver.is_dominated(state, region, monster_cells, 100)
+    assert not solver.is_dominated(state, region, monster_cells, 90)
+    assert not solver.is_dominated(weaker, region, monster_cells, 90)
+    # The weaker state replaced the stronger one
+    assert solver.is_dominated(state, region, monster_cells, 90)
+    assert not solver.is_dominated(mixed, region, monster_cells, 80)
+    # With the red killed, the state dominates every one with the red
+    fewer = bytearray(state)
+    fewer[red] = main.floor
+    assert not solver.is_dominated(bytes(fewer), region,
+                                   monster_cells - {red}, 70)
+    assert solver.is_dominated(mixed, region, monster_cells, 75)
+    assert not solver.is_dominated(mixed, region, monster_cells, 65)
+    assert not solver.is_dominated(state, (region[0] + 1,), monster_cells, 200)
+    assert len(solver.dominance_table) == 2
+
+
+@pytest.mark.parametrize('search', ['dfs', 'astar'])
+@pytest.mark.parametrize('text, cost', [(SAMPLE_BOARD, 220),
+                                        (LARGE_BOARD, 390)] +
+                         [param.values for param in SMALL_BOARDS])
+def test_solve_dominance(text, cost, search):
+    """Test dominance pruning keeps the cost on the test boards, never
+    expands more nodes and doesn't claim the cost is proven."""
+    plain = main.solve_board(text, search)
+    solution = main.solve_board(text, search, dominance=True)
+    assert solution.cost == plain.cost == cost
+    assert solution.nodes_expanded <= plain.nodes_expanded
+    assert solution.lower_bound is None and solution.gap() is None
+
+
+@pytest.mark.parametrize('search', ['search_dfs', 'search_astar'])
+@pytest.mark.parametrize('text, cost', [(SYMMETRIC_BOARD, 310)] +
+                         [param.values for param in SMALL_BOARDS])
+def test_solve_symmetry(text, cost, search):
+    """Test canonical keys keep the optimal cost and, on a symmetric board,
+    expand fewer nodes."""
+    nodes_expanded = []
+    for symmetry in (False, True):
+        solver = main.Solver(symmetry=symmetry)
+        getattr(solver, search)(solver.load(text))
+        assert solver.cost_best == cost
+        nodes_expanded.append(solver.nodes_expanded)
+    if text == SYMMETRIC_BOARD:
+        assert nodes_expanded[1] < nodes_expanded[0]
+    else:
+        assert nodes_expanded[1] == nodes_expanded[0]
+
+
+def test_knight_region():
+    """Test cells of one floor region share the region and its first cell,
+    and cells split by walls and monsters don't."""
+    solver = main.Solver()
+    root = solver.load(SMALL_BOARDS[2].values[0])
+    state, cols = root[0], solver.cols
+    region = solver.knight_region(state, root[3])
+    assert list(region) == sorted(region)
+    assert root[3] in region
+    assert solver.knight_region(state, 3 * cols + 2) is region
+    assert solver.knight_region(state, 2 * cols + 5)[0] == 2 * cols + 5
+    assert 2 * cols + 5 not in region
+
+
+@pytest.mark.parametrize('ordering', main.orderings)
+@pytest.mark.parametrize('text, cost', [(SAMPLE_BOARD, 220)] +
+                         [param.values for param in SMALL_BOARDS])
+def test_solve_orderings(text, cost, ordering):
+    """Test every move ordering finds the optimal cost and records
+    the better solutions it found on the way."""
+    solution = main.solve_board(text, ordering=ordering)
+    assert solution.cost == cost
+    costs = [incumbent[0] for incumbent in solution.incumbents]
+    assert costs[-1] == cost
+    assert costs == sorted(costs, reverse=True)
+    nodes = [incumbent[1] for incumbent in solution.incumbents]
+    assert nodes == sorted(nodes)
+    assert nodes[-1] <= solution.nodes_expanded
+
+
+def test_order_efficiency():
+    """Test the efficiency ordering puts most health per cost first."""
+    solver = main.Solver(ordering='efficiency')
+    root = solver.load(SAMPLE_BOARD)
+    children = solver.order(solver.expand(root), 1)
+    efficiency = [main.attack_efficiency(child) for child in children]
+    assert efficiency == sorted(efficiency, reverse=True)
+
+
+def test_order_history():
+    """Test the history ordering tries the killer attack of the depth first,
+    then the attacks of better solutions."""
+    solver = main.Solver(ordering='history')
+    root = solver.load(SAMPLE_BOARD)
+    children = solver.expand(root)
+    killer, used = children[-1], children[-2]
+    solver.killers[1] = (killer[1], killer[3])
+    solver.history[(used[1], used[3])] = 5
+    ordered = solver.order(list(children), 1)
+    assert ordered[:2] == [killer, used]
+    assert ordered[2:] == children[:-2]
+
+
+def test_order_history_cutoffs():
+    """Test the history ordering learns from the bound cutoffs and expands
+    fewer nodes than the weapon order on a corpus board."""
+    text = puzzles.generate_board(481185381, rows=8, cols=8, monsters=5,
+                                  wall_density=0.2)
+    solutions = {ordering: main.solve_board(text, ordering=ordering,
+                                            quiet=True)
+                 for ordering in ('weapon', 'history')}
+    assert solutions['weapon'].cost == solutions['history'].cost == 320
+    assert solutions['history'].nodes_expanded < \
+        solutions['weapon'].nodes_expanded
+
+
+def test_unknown_ordering():
+    """Test an unknown move ordering is rejected."""
+    with pytest.raises(ValueError, match='ordering'):
+        main.Solver(ordering='random')
+
+
+@pytest.mark.parametrize('node_limit', [1, 10, 100, 1000])
+@pytest.mark.parametrize('search', ['dfs', 'astar'])
+def test_solve_board_node_limit(search, node_limit):
+    """Test the search stops at the node limit with a bound below the
+    optimum and a cost above it."""
+    solution = main.solve_board(LARGE_BOARD, search, node_limit=node_limit)
+    assert solution.nodes_expanded == node_limit
+    assert solution.stopped == 'nodes'
+    assert main.health_cost(2, 2, 1) <= solution.lower_bound <= 390
+    if solution.cost is not None:
+        assert solution.cost >= 390
+        assert solution.gap() == solution.cost - solution.lower_bound
+
+
+def test_solve_board_memory_limit():
+    """Test the search stops once the process used more memory."""
+    with patch('main.current_memory', return_value=100):
+        solution = main.solve_board(LARGE_BOARD, memory_limit=100)
+    assert solution.stopped == 'memory'
+    assert solution.nodes_expanded == 1
+
+
+def test_solve_board_memory_limit_after_peak():
+    """Test memory freed before the search doesn't count against it."""
+    if not os.path.exists('/proc/self/statm'):
+        pytest.skip('needs /proc')
+    block = bytearray(300 * 2 ** 20)
+    block[::4096] = b'x' * len(block[::4096])
+    del block
+    assert main.peak_memory() > main.current_memory() + 200
+    solution = main.solve_board(LARGE_BOARD,
+                                memory_limit=main.current_memory() + 100)
+    assert solution.stopped is None
+    assert solution.cost == 390
+
+
+@pytest.mark.parametrize('search', ['dfs', 'astar'])
+def test_solve_board_limit_on_last_node(search):
+    """Test a budget that runs out when nothing is left isn't reported."""
+    # The knight is walled in, away from every monster
+    text = SAMPLE_BOARD.replace('S', '.').replace(
+        'WW........WW\nWW........WW', 'WWSW......WW\nWWWW......WW', 1)
+    solution = main.solve_board(text, search, node_limit=1)
+    assert solution.nodes_expanded == 1
+    assert solution.stopped is None
+    assert solution.cost is None and solution.lower_bound is None
+
+
+@pytest.mark.parametrize('search', ['dfs', 'astar'])
+def test_solve_board_finished_bound(search):
+    """Test a finished search proves its own cost."""
+    solution = main.solve_board(SAMPLE_BOARD, search)
+    assert solution.stopped is None
+    assert solution.lower_bound == solution.cost == 220
+    assert solution.gap() == 0
+
+
+def test_solve_board_on_incumbent():
+    """Test the callback gets every better solution as it is found."""
+    found = []
+    solution = main.solve_board(LARGE_BOARD, on_incumbent=found.append)
+    assert [s.cost for s in found] == \
+        [incumbent[0] for incumbent in solution.incumbents]
+    assert found[-1].cost == 390
+    assert found[-1].path == solution.path
+    for s in found:
+        assert s.moves()[-1][1] == s.cost
+    # Nothing is proven before the search returned
+    assert found[0].cost > 390
+    assert all(s.lower_bound is None and s.gap() is None for s in found)
+    assert solution.lower_bound == 390
+
+
+@pytest.mark.parametrize('search', ['dfs', 'astar'])
+@pytest.mark.parametrize('text, cost', [(SAMPLE_BOARD, 220)] +
+                         [param.values for param in SMALL_BOARDS])
+def test_solve_small_table(text, cost, search):
+    """Test a transposition table much too small for the search still
+    finds the optimal cost, only expanding more nodes."""
+    solver = main.Solver(table_mb=0.0002)
+    assert solver.solve_board(text, search).cost == cost
+    assert len(solver.transposition_table) <= \
+        solver.transposition_table.buckets * 4
+
+
+@pytest.mark.parametrize('search', ['dfs', 'astar'])
+def test_solve_board_stats(search):
+    """Test the stats of a search add up and dump to JSON."""
+    solution = main.solve_board(LARGE_BOARD, search)
+    stats = solution.stats
+    assert stats.nodes_expanded == solution.nodes_expanded
+    assert set(stats.moves_generated) <= {'Sword', 'Spear', 'Dagger', 'Bow'}
+    # Every attack makes a child unless its state is a duplicate
+    assert sum(stats.moves_generated.values()) > stats.duplicates > 0
+    # Children that improve on a known state replace its entry
+    assert 0 < stats.peak_table_size <= \
+        sum(stats.moves_generated.values()) - stats.duplicates
+    assert stats.flood_fills > 0
+    assert 0 < stats.flood_fill_time < stats.elapsed
+    assert (stats.bound_prunes > 0) == (search == 'dfs')
+    dumped = json.loads(stats.to_json())
+    assert dumped['nodes_per_second'] == stats.nodes_per_second() > 0
+    assert dumped['moves_generated'] == stats.moves_generated
+
+
+def test_solve_parallel_stats():
+    """Test the stats of the workers are added to the search stats."""
+    solution = main.solve_board(LARGE_BOARD, workers=2)
+    stats = solution.stats
+    assert solution.cost == 390
+    assert stats.nodes_expanded == solution.nodes_expanded
+    assert stats.bound_prunes > 0
+    assert sum(stats.moves_generated.values()) > stats.duplicates > 0
+
+
+@pytest.mark.parametrize('text, cost', [(SAMPLE_BOARD, 220)] +
+                         [param.values for param in SMALL_BOARDS])
+def test_numpy_backend(text, cost):
+    """Test the NumPy backend finds the same children and costs."""
+    pytest.importorskip('numpy')
+    children = []
+    for backend in main.backends:
+        solver = main.Solver(backend=backend)
+        root = solver.load(text)
+        children.append(sorted(
+            (child[0], child[2], solver.knight_region(child[0], child[3]))
+            for child in solver.expand(root)))
+        assert main.solve_board(text, backend=backend).cost == cost
+    assert children[0] == children[1]
+
+
+def test_numpy_fill_region():
+    """Test the NumPy fill labels the same regions as the kernel's."""
+    pytest.importorskip('numpy')
+    text = puzzles.generate_board(3, rows=20, cols=30, monsters=60,
+                                  wall_density=0.3)
+    state = main.parse_board(text)[0]
+    regions = []
+    for backend in main.backends:
+        solver = main.Solver(backend=backend)
+        solver.load(text)
+        for loc, cell in enumerate(state):
+            if cell == main.floor:
+                solver.get_floor_region(state, loc)
+        regions.append(solver.floor_cache[state])
+    assert regions[0] == regions[1]
+    assert len(regions[0][1]) > 1
+
+
+def test_floor_cache_memory():
+    """Test the floor cache of a large crowded board stays within its MB,
+    which an entry count didn't bound."""
+    text = puzzles.generate_board(1, rows=40, cols=40, monsters=10)
+    solver = main.Solver(floor_cache_mb=0.5, table_mb=1, quiet=True)
+    tracemalloc.start()
+    try:
+        solver.solve_board(text, node_limit=50)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert solver.floor_cache_bytes == sum(
+        sys.getsizeof(state) + sys.getsizeof(labels) +
+        sum(map(sys.getsizeof, regions))
+        for state, (labels, regions) in solver.floor_cache.items())
+    assert solver.floor_cache_bytes < 0.6 * 2 ** 20
+    assert peak < 4 * 2 ** 20
+
+
+def test_numpy_backend_missing():
+    """Test the NumPy backend needs NumPy and unknown backends fail."""
+    with patch('main.numpy', None):
+        with pytest.raises(ImportError, match='NumPy'):
+            main.Solver(backend='numpy')
+    with pytest.raises(ValueError, match='backend'):
+        main.Solver(backend='cython')
+
+
+@pytest.mark.parametrize('search, workers', [('dfs', 1), ('astar', 1),
+                                             ('dfs', 2)])
+def test_solve_board_quiet(capsys, search, workers):
+    """Test a quiet search prints nothing, also in the workers, and
+    a default one prints its progress."""
+    main.solve_board(SAMPLE_BOARD, search, quiet=True, workers=workers)
+    assert capsys.readouterr().out == ''
+    main.solve_board(SAMPLE_BOARD, search)
+    assert 'Best cost: 220\n' in capsys.readouterr().out
+
+
+def test_traces():
+    """Test the trace formats write the moves of the solution."""
+    solution = main.solve_board(SAMPLE_BOARD, quiet=True)
+    out = io.StringIO()
+    main.write_moves(solution, out)
+    assert out.getvalue().splitlines() == [
+        '{} {} {} {}'.format(action, cost, row, col)
+        for action, cost, (row, col) in solution.moves()]
+
+    out = io.StringIO()
+    main.write_json(solution, out)
+    record = json.loads(out.getvalue())
+    assert record == main.solution_record(solution)
+    assert record['cost'] == 220
+    assert record['moves'][-1][:2] == [solution.moves()[-1][0], 220]
+
+    out = io.StringIO()
+    main.write_boards(solution, out)
+    boards = out.getvalue()
+    assert boards.count('Action: ') == len(solution.path)
+    assert boards.count('*') == len(solution.path)
+    assert board_text(solution.path[0], solution.cols) in \
+        boards.replace('*', 'S')
+
+
+def corridor_board(blues):
+    """Returns a one cell high board with the start and a row of blues."""
+    inner = 'S.' + 'B' * blues + '.'
+    width = len(inner) + 4
+    rows = ['W' * width] * 2 + ['WW' + inner + 'WW'] + ['W' * width] * 2
+    return '\n'.join(rows) + '\n'
+
+
+@pytest.mark.parametrize('search, workers', [('dfs', 1), ('astar', 1),
+                                             ('dfs', 2)])
+def test_solve_deep_solution(search, workers):
+    """Test a solution of 150 moves is found with little stack to spare,
+    i.e. neither the search depth nor passing the solution back from a
+    worker uses the Python stack."""
+    text = corridor_board(300)
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(len(inspect.stack()) + 50)
+    try:
+        solution = main.solve_board(text, search, quiet=True,
+                                    workers=workers)
+    finally:
+        sys.setrecursionlimit(limit)
+    # A spear kills the next two blues for 70
+    assert solution.cost == 300 * 35
+    assert len(solution.moves()) == 150
+
+
+@lru_cache(maxsize=None)
+def relaxation_cost(blue, purple, red):
+    """Returns the health_cost relaxation by trying every attack."""
+    if not blue + purple + red:
+        return 0
+    return min(cost + relaxation_cost(blue - b + p, purple - p + r, red - r)
+               for cost, capacity in ((50, 1), (70, 2), (80, 3))
+               for r in range(min(red, capacity) + 1)
+               for p in range(min(purple, capacity - r) + 1)
+               for b in range(min(blue, capacity - r - p) + 1) if r + p + b)
+
+
+def test_health_cost_matches_relaxation():
+    """Test the closed form finds the cheapest plan of attacks."""
+    for counts in itertools.product(range(7), repeat=3):
+        assert main.health_cost(*counts) == relaxation_cost(*counts)
+
+
+def test_health_cost_many_monsters():
+    """Test the bound of many monsters needs no deep recursion."""
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(len(inspect.stack()) + 50)
+    try:
+        cost = main.health_cost(0, 0, 200)
+    finally:
+        sys.setrecursionlimit(limit)
+    # Swords hit three reds at a time, 200 reds take 200 of them
+    assert cost == 200 * 80
+
+
+@pytest.mark.parametrize('size, seed', [(20, 1), (30, 2), (40, 3)])
+def test_solve_large_boards(size, seed):
+    """Test boards of hundreds of cells are solved to the same cost by
+    both searches."""
+    text = puzzles.generate_board(seed, size, size, monsters=3)
+    costs = [main.solve_board(text, search, quiet=True).cost
+             for search in ('dfs', 'astar')]
+    assert costs[0] == costs[1] is not None
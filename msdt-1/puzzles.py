@@ -0,0 +1,91 @@
+import argparse
+import random
+'''
+Seeded generator of knight and monsters boards for main.py.
+
+The same seed and sizes always give the same board, e.g.
+    python puzzles.py 7 --rows 8 --cols 8 --monsters 4 --walls 0.1
+
+Every board is wrapped in the double wall main.py needs and has one
+start. Walls can shut monsters in, so not every board has a solution.
+'''
+
+wall_width = 2
+monster_symbols = 'BPR'
+
+
+# -------------------------------------------------------------------------------
+def generate_board(seed, rows=8, cols=8, monsters=4, wall_density=0.1):
+    """Returns the text of a random board.
+
+    rows and cols are the size inside the double wall, monsters the number
+    of monsters, each with a random health, and wall_density the share of
+    the other inner cells that are walls.
+    """
+    if monsters + 1 > rows * cols:
+        raise ValueError('{} monsters and a start don\'t fit on {}x{}'
+                         .format(monsters, rows, cols))
+    rng = random.Random(seed)
+    cells = [(r, c) for r in range(rows) for c in range(cols)]
+    rng.shuffle(cells)
+    start = cells[0]
+    monster_cells = cells[1:monsters + 1]
+    others = cells[monsters + 1:]
+    walls = others[:int(len(others) * wall_density)]
+
+    grid = [['.'] * cols for _ in range(rows)]
+    grid[start[0]][start[1]] = 'S'
+    for r, c in monster_cells:
+        grid[r][c] = rng.choice(monster_symbols)
+    for r, c in walls:
+        grid[r][c] = 'W'
+
+    width = cols + 2 * wall_width
+    lines = ['W' * width] * wall_width
+    lines += ['W' * wall_width + ''.join(row) + 'W' * wall_width
+              for row in grid]
+    lines += ['W' * width] * wall_width
+    return '\n'.join(lines) + '\n'
+
+
+# -------------------------------------------------------------------------------
+def generate_corpus(seed, count, sizes=((6, 6), (7, 7), (8, 8)),
+                    monsters=(3, 4, 5), wall_densities=(0.0, 0.1, 0.2)):
+    """Yields (id, spec, board text) of count boards.
+
+    Each board takes its size, monster count and wall density at random
+    from the given choices; spec is the dict of generate_board arguments,
+    so the board can be generated again.
+    """
+    rng = random.Random(seed)
+    for number in range(count):
+        rows, cols = rng.choice(sizes)
+        spec = {'seed': rng.randrange(2 ** 32), 'rows': rows, 'cols': cols,
+                'monsters': rng.choice(monsters),
+                'wall_density': rng.choice(wall_densities)}
+        yield 'board-{}'.format(number), spec, generate_board(**spec)
+
+
+# -------------------------------------------------------------------------------
+# Main
+# -------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='Prints a random knight and '
+                                                 'monsters board.')
+    parser.add_argument('seed', type=int, help='seed of the board')
+    parser.add_argument('--rows', type=int, default=8,
+                        help='rows inside the double wall, 8 by default')
+    parser.add_argument('--cols', type=int, default=8,
+                        help='columns inside the double wall, 8 by default')
+    parser.add_argument('--monsters', type=int, default=4,
+                        help='number of monsters, 4 by default')
+    parser.add_argument('--walls', type=float, default=0.1,
+                        help='share of the free cells that are walls, '
+                             '0.1 by default')
+    args = parser.parse_args()
+    print(generate_board(args.seed, args.rows, args.cols, args.monsters,
+                         args.walls), end='')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+import pytest
+
+import main
+import puzzles
+
+
+@pytest.mark.parametrize('rows, cols, monsters, wall_density',
+                         [(6, 6, 3, 0.0), (8, 8, 5, 0.2), (5, 9, 4, 0.5)])
+def test_generate_board(rows, cols, monsters, wall_density):
+    """Test boards have the double wall, one start and the monsters."""
+    text = puzzles.generate_board(1, rows, cols, monsters, wall_density)
+    lines = text.split('\n')
+    assert lines[-1] == ''
+    lines = lines[:-1]
+    assert len(lines) == rows + 4
+    assert all(len(line) == cols + 4 for line in lines)
+    assert lines[0] == lines[1] == lines[-2] == lines[-1] == 'W' * (cols + 4)
+    assert all(line.startswith('WW') and line.endswith('WW')
+               for line in lines)
+    inner = ''.join(line[2:-2] for line in lines[2:-2])
+    assert inner.count('S') == 1
+    assert sum(inner.count(m) for m in 'BPR') == monsters
+    free = rows * cols - monsters - 1
+    assert inner.count('W') == int(free * wall_density)
+    main.parse_board(text)
+
+
+def test_generate_board_seeded():
+    """Test a seed always gives the same board and other seeds others."""
+    boards = [puzzles.generate_board(seed) for seed in range(10)]
+    assert boards == [puzzles.generate_board(seed) for seed in range(10)]
+    assert len(set(boards)) == 10
+
+
+def test_generate_board_too_many_monsters():
+    """Test a board without room for the monsters is rejected."""
+    with pytest.raises(ValueError):
+        puzzles.generate_board(1, 2, 2, 4)
+
+
+def test_generate_corpus():
+    """Test the corpus is seeded and its specs give its boards again."""
+    corpus = list(puzzles.generate_corpus(5, 20))
+    assert corpus == list(puzzles.generate_corpus(5, 20))
+    assert len({board_id for board_id, _, _ in corpus}) == 20
+    for _, spec, text in corpus:
+        assert puzzles.generate_board(**spec) == text
@@ -0,0 +1,93 @@
+from array import array
+'''
+Fixed-capacity transposition table for the solver in main.py.
+
+The solver keeps the lowest cost each state was reached at in a dict,
+which grows with every state of the search. This table has the same
+get/set interface but preallocates its slots from a size in MB and then
+never grows: it keeps a 64-bit fingerprint of each key instead of the
+key, and once the bucket of a key is full, it replaces the entry that
+was reached at the highest cost.
+'''
+
+# Slots per bucket
+ways = 4
+# Bytes per slot: 8 for the fingerprint, 4 for the cost
+slot_size = 12
+
+
+# -------------------------------------------------------------------------------
+class TranspositionTable:
+    """
+    Maps keys to costs in a fixed number of slots.
+
+    A key is found again by its hash, so two keys with the same 64-bit
+    hash share an entry; the chance of that is negligible for the number
+    of states a search visits. Lost entries only make the search visit
+    a state again, so the table degrades gracefully when it is too small.
+
+    Replacement policy: cheap entries sit near the start of the search
+    and stand for the largest subtrees, so a full bucket evicts the
+    entry with the highest cost, i.e. the deepest node.
+
+    Attributes
+        buckets: number of buckets of ways slots each.
+        fingerprints: hash of the key of every slot, 0 for empty slots.
+        costs: cost of every slot, at most 2 ** 32 - 1, which holds
+            main.no_cost.
+        entries: number of slots in use.
+        evictions: number of entries replaced by another key.
+    """
+
+    def __init__(self, size_mb):
+        self.buckets = max(1, int(size_mb * 2 ** 20) // (slot_size * ways))
+        self.fingerprints = None
+        self.costs = None
+        self.entries = 0
+        self.evictions = 0
+        self.clear()
+
+    def clear(self):
+        """Empties every slot."""
+        slots = self.buckets * ways
+        # Free the old slots first, so they never exist twice
+        self.fingerprints = self.costs = None
+        self.fingerprints = array('q', [0]) * slots
+        self.costs = array('I', [0]) * slots
+        self.entries = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return self.entries
+
+    def get(self, key, default=None):
+        """Returns the cost stored for the key, default if there is none."""
+        fingerprint = hash(key) or 1
+        first = fingerprint % self.buckets * ways
+        fingerprints = self.fingerprints
+        for slot in range(first, first + ways):
+            if fingerprints[slot] == fingerprint:
+                return self.costs[slot]
+        return default
+
+    def __setitem__(self, key, cost):
+        """Stores the cost of the key, evicting an entry if needed."""
+        fingerprint = hash(key) or 1
+        first = fingerprint % self.buckets * ways
+        fingerprints = self.fingerprints
+        costs = self.costs
+        victim = first
+        for slot in range(first, first + ways):
+            if fingerprints[slot] == fingerprint:
+                costs[slot] = cost
+                return
+            if not fingerprints[slot]:
+                fingerprints[slot] = fingerprint
+                costs[slot] = cost
+                self.entries += 1
+                return
+            if costs[slot] > costs[victim]:
+                victim = slot
+        fingerprints[victim] = fingerprint
+        costs[victim] = cost
+        self.evictions += 1
@@ -0,0 +1,66 @@
+import pytest
+
+from transposition import TranspositionTable, slot_size, ways
+
+
+def keys_of_bucket(table, bucket, count):
+    """Returns count keys whose fingerprints fall into the bucket."""
+    keys = []
+    i = 1
+    while len(keys) < count:
+        if hash(i) % table.buckets == bucket:
+            keys.append(i)
+        i += 1
+    return keys
+
+
+@pytest.mark.parametrize('size_mb', [0.001, 0.01, 0.1])
+def test_capacity(size_mb):
+    """Test the slots fill the size in MB and never grow."""
+    table = TranspositionTable(size_mb)
+    slots = table.buckets * ways
+    assert slots * slot_size <= max(size_mb * 2 ** 20, slot_size * ways)
+    for i in range(3 * slots):
+        table[('state', i)] = i % 1000
+    assert len(table) <= slots
+    assert len(table.fingerprints) == len(table.costs) == slots
+
+
+def test_get_set():
+    """Test stored costs are found again and updated in place."""
+    table = TranspositionTable(1)
+    assert table.get((b'board', 3), 10) == 10
+    table[(b'board', 3)] = 120
+    table[(b'board', 4)] = 80
+    assert table.get((b'board', 3), 10) == 120
+    table[(b'board', 3)] = 100
+    assert table.get((b'board', 3)) == 100
+    assert table.get((b'board', 4)) == 80
+    assert len(table) == 2
+    table.clear()
+    assert table.get((b'board', 3)) is None
+    assert len(table) == 0
+
+
+def test_evicts_highest_cost():
+    """Test a full bucket replaces its most expensive entry."""
+    table = TranspositionTable(0.001)
+    keys = keys_of_bucket(table, 0, ways + 1)
+    for cost, key in enumerate(keys[:ways]):
+        table[key] = 100 - cost
+    table[keys[-1]] = 500
+    assert table.evictions == 1
+    assert table.get(keys[0]) is None
+    assert table.get(keys[-1]) == 500
+    for cost, key in enumerate(keys[1:ways], 1):
+        assert table.get(key) == 100 - cost
+
+
+def test_large_costs():
+    """Test costs beyond 16 bits are stored, up to the solver's no_cost."""
+    table = TranspositionTable(0.01)
+    table['state'] = 70000
+    table['other'] = 2 ** 31 - 1
+    assert table.get('state') == 70000
+    assert table.get('other') == 2 ** 31 - 1
+    assert table.costs.itemsize * 8 >= 32
@@ -351,27 +351,17 @@ def doAttacks(history, attacks, push_dir_row, push_dir_col, action, cost_add, r,
                 state[a[0]][a[1]] = mon
     action += ' ' + doTextDirection(push_dir_row, push_dir_col)
     cost += cost_add
-    '''
-    do_append = True
-    for item in history_complete:
-        if item[0] == state and item[1] < cost:
-            do_append = False
-            break
-
-    if do_append:
-        history_complete.append([state, cost])
-        history.append([state, action, cost, [r, c]])
-
-        solve(history)
-    '''
-    # This is way faster than the above even though it is recording
-    # more data than necessary
-    if [state, cost] not in history_complete:
-        history_complete.append([state, cost])
+    # Skip the move if the same board with the knight on the same cell was already reached at the same or lower cost
+    key = boardKey(state, r, c)
+    if history_complete.get(key, cost + 1) > cost:
+        history_complete[key] = cost
         history.append([state, action, cost, [r, c]])
 
         solve(history)
 # -------------------------------------------------------------------------------
+def boardKey(state, r, c):
+    return tuple(''.join(row) for row in state), r, c
+# -------------------------------------------------------------------------------
 def doTextDirection(push_dir_row, push_dir_col):
     if push_dir_row == -1:
         return 'North'
@@ -398,8 +388,8 @@ monster_purple = 'P'
 monster_red = 'R'
 start = 'S'
 
-# Optimization: history_complete is used to ignore duplicate state and cost situations, which is common in recursive bow and dagger attacks; only includes state[0] and cost[1]
-history_complete = []
+# Optimization: history_complete maps boardKey() to the lowest cost it was reached at, so duplicate and more expensive repeats of a state, which are common in recursive bow and dagger attacks, are dropped in O(1)
+history_complete = {}
 
 history_best = []
 cost_best = 9999